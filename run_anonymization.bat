@@ -33,7 +33,7 @@ call "%ACTIVATE%"
 
 REM === Запускаем скрипт ===
 echo [INFO] Запуск src\anonimization.py...
-python src\anonimization.py
+python src\anonimization.py --input data\table1.xlsx --output output\example.xlsx --interactive
 
 
 
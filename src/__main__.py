@@ -0,0 +1,11 @@
+import sys
+from pathlib import Path
+
+# modules import each other by name, as with python src/anonimization.py;
+# python -m src from the repository root does not put src on the path
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import cli  # noqa: E402
+
+if __name__ == "__main__":
+    sys.exit(cli.main())
@@ -1,19 +1,90 @@
+import hashlib
+import hmac
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
 
 
-import dictionaries as dicts
-
+import binning
+import profiling
+import lookup_tables
+import spatial
 
 # ============================================
 # 📦 Data loading
 # ============================================
 
 
-def Load_table(path: str) -> pd.DataFrame:
+formats = {
+    ".xlsx": "excel",
+    ".xls": "excel",
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".ipc": "feather",
+}
+
+
+# repeated strings load as categoricals, cards stay numeric until validation
+input_dtypes = {
+    "store_name": "category",
+    "date-time": "category",
+    "coordinates": "category",
+    "categories": "category",
+    "brands": "category",
+}
+
+
+def get_dtypes(columns: list[str] | None) -> dict:
+    return {
+        column: dtype
+        for column, dtype in input_dtypes.items()
+        if columns is None or column in columns
+    }
+
+
+def get_format(path: Path, file_format: str | None = None) -> str:
+    if file_format is not None:
+        return file_format
+    try:
+        return formats[path.suffix.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown table format: {path.suffix}") from None
+
+
+def get_projection(quasi_ids: list[str] | None = None) -> list[str]:
+    # anonymized columns, or only the quasi-identifiers for a report run
+    if quasi_ids is None:
+        return list(methods)
+    return [column for column in methods if column in quasi_ids]
+
+
+def Load_table(
+    path: str, columns: list[str] | None = None, file_format: str | None = None
+) -> pd.DataFrame:
     path = Path(path)
-    table = pd.read_excel(path)
+    with profiling.stage("load") as record:
+        match get_format(path, file_format):
+            case "excel":
+                table = pd.read_excel(path, usecols=columns, dtype=get_dtypes(columns))
+            case "csv":
+                table = pd.read_csv(path, usecols=columns, dtype=get_dtypes(columns))
+            case "parquet":
+                import pyarrow.parquet as pq
+
+                # dictionary pages decode straight into categoricals
+                table = pq.read_table(
+                    path, columns=columns, read_dictionary=list(get_dtypes(columns))
+                ).to_pandas()
+            case "feather":
+                table = pd.read_feather(path, columns=columns)
+        table = table.astype(get_dtypes(list(table.columns)))
+        record["rows"] = len(table)
     return table
 
 
@@ -23,10 +94,23 @@ def Load_table(path: str) -> pd.DataFrame:
 
 
 def table_validate(table: pd.DataFrame) -> pd.DataFrame:
-    table["cards_number"] = table["cards_number"].astype(str)
+    with profiling.stage("table_validate", len(table)):
+        if "cards_number" in table.columns:
+            table["cards_number"] = transform_uniques(
+                table["cards_number"], lambda cards: cards.astype(str)
+            )
+        for column in ("price", "number_of_products", "total_cost"):
+            if column in table.columns and pd.api.types.is_integer_dtype(table[column]):
+                table[column] = pd.to_numeric(table[column], downcast="integer")
     return table
 
 
+def check_columns(table: pd.DataFrame, columns: list[str]):
+    missing = [column for column in columns if column not in table.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+
 def correct_output(table: pd.DataFrame) -> pd.DataFrame:
     table = table.rename(
         {
@@ -43,9 +127,27 @@ def correct_output(table: pd.DataFrame) -> pd.DataFrame:
 # ============================================
 
 
-def export_output(table: pd.DataFrame, path: str):
+def export_output(
+    table: pd.DataFrame,
+    path: str,
+    file_format: str | None = None,
+    report: dict | None = None,
+    quasi_ids: list[str] | None = None,
+):
     path = Path(path)
-    table.to_excel(path, index=False)
+    with profiling.stage("export", len(table)):
+        match get_format(path, file_format):
+            case "excel":
+                import streaming
+
+                # write-only workbook, with report sheets after the data
+                streaming.write_excel(table, path, report, quasi_ids)
+            case "csv":
+                table.to_csv(path, index=False)
+            case "parquet":
+                table.to_parquet(path, index=False)
+            case "feather":
+                table.reset_index(drop=True).to_feather(path)
 
 
 # ============================================
@@ -54,6 +156,9 @@ def export_output(table: pd.DataFrame, path: str):
 
 
 def anonymize_card_number(card: str) -> str:
+    # a missing card stays missing, as in anonymize_card_numbers
+    if pd.isna(card):
+        return card
     card = str(card)[0:4] + "************"
     return card
 
@@ -68,80 +173,95 @@ def anonymize_date_time(date_time: str) -> datetime:
 
 
 def anonymize_store(store: str) -> str:
-    store = dicts.anonymized_stores[store]
+    store = lookup_tables.map_value(store, "anonymized_stores")
     return store
 
 
 def anonymize_coords(coords: str) -> str:
-    return dicts.districts[coords]
+    return spatial.locate_value(coords)
 
 
 def anonymize_total_cost(cost: int) -> str:
-    match cost:
-        case n if 0 <= n <= 500:
-            return "<=500"
-        case n if 500 < n <= 1000:
-            return "500-1000"
-        case n if 1000 < n <= 2000:
-            return "1000-2000"
-        case n if 2000 < n <= 5000:
-            return "2000-5000"
-        case n if 5000 < n <= 10000:
-            return "5000-10000"
-        case n if 10000 < n <= 30000:
-            return "10000-30000"
-        case n if 30000 < n <= 50000:
-            return "30000-50000"
-        case n if 50000 < n <= 100000:
-            return "50000-100000"
-        case n if n > 100000:
-            return "100000+"
+    return binning.generalize_value(cost, binning.bins["total_cost"])
 
 
 def anonymize_num_products(num: int) -> str:
-    match num:
-        case 1:
-            return "1"
-        case n if 2 <= n <= 3:
-            return "2-3"
-        case n if 4 <= n <= 6:
-            return "4-6"
-        case n if n > 6:
-            return "6+"
+    return binning.generalize_value(num, binning.bins["number_of_products"])
 
 
 def anonymize_price(price: int) -> str:
-    match price:
-        case n if 0 <= n <= 500:
-            return "<=500"
-        case n if 500 < n <= 1000:
-            return "500-1000"
-        case n if 1000 < n <= 2000:
-            return "1000-2000"
-        case n if 2000 < n <= 5000:
-            return "2000-5000"
-        case n if 5000 < n <= 10000:
-            return "5000-10000"
-        case n if 10000 < n <= 30000:
-            return "10000-30000"
-        case n if 30000 < n <= 50000:
-            return "30000-50000"
-        case n if 50000 < n <= 100000:
-            return "50000-100000"
-        case n if n > 100000:
-            return "100000+"
+    return binning.generalize_value(price, binning.bins["price"])
 
 
 def anonymize_categories(cat: str) -> str:
-    cat = dicts.categories[cat]
+    cat = lookup_tables.map_value(cat, "categories")
     return cat
 
 
 def anonymize_brand(brand: str) -> str:
-    brand = dicts.brands[brand]
+    brand = lookup_tables.map_value(brand, "brands")
     return brand
 
 
+# ============================================
+# 🚀 Vectorized anonimization functions
+# ============================================
+
+
+def transform_uniques(column: pd.Series, transform) -> pd.Series:
+    # transform each distinct value once and broadcast back by codes
+    codes, uniques = pd.factorize(column, use_na_sentinel=False)
+    transformed = np.asarray(transform(pd.Series(uniques)), dtype=object)
+
+    # distinct inputs may share an output, e.g. dates of one month
+    category_codes, categories = pd.factorize(pd.Series(transformed, dtype=object))
+    generalized = pd.Categorical.from_codes(category_codes[codes], categories)
+    return pd.Series(generalized, index=column.index, name=column.name)
+
+
+def anonymize_card_numbers(column: pd.Series) -> pd.Series:
+    return transform_uniques(
+        column, lambda cards: cards.astype(str).str[0:4] + "************"
+    )
+
+
+def anonymize_dates_times(column: pd.Series) -> pd.Series:
+    return transform_uniques(
+        column,
+        lambda dates: pd.to_datetime(dates, format="ISO8601")
+        .dt.to_period("M")
+        .astype(str),
+    )
+
+
+def anonymize_stores(column: pd.Series) -> pd.Series:
+    return lookup_tables.map_column(column, "anonymized_stores")
+
+
+def anonymize_coords_column(column: pd.Series) -> pd.Series:
+    return spatial.locate_column(column)
+
+
+def anonymize_total_costs(column: pd.Series) -> pd.Series:
+    return binning.generalize_range(column, binning.bins["total_cost"])
+
+
+def anonymize_nums_products(column: pd.Series) -> pd.Series:
+    return binning.generalize_range(column, binning.bins["number_of_products"])
+
+
+def anonymize_prices(column: pd.Series) -> pd.Series:
+    return binning.generalize_range(column, binning.bins["price"])
+
+
+def anonymize_categories_column(column: pd.Series) -> pd.Series:
+    return lookup_tables.map_column(column, "categories")
+
+
+def anonymize_brands(column: pd.Series) -> pd.Series:
+    return lookup_tables.map_column(column, "brands")
+
+
 methods = {
     "cards_number": anonymize_card_number,
     "date-time": anonymize_date_time,
@@ -155,82 +275,244 @@ methods = {
 }
 
 
+vectorized_methods = {
+    "cards_number": anonymize_card_numbers,
+    "date-time": anonymize_dates_times,
+    "store_name": anonymize_stores,
+    "coordinates": anonymize_coords_column,
+    "total_cost": anonymize_total_costs,
+    "number_of_products": anonymize_nums_products,
+    "price": anonymize_prices,
+    "categories": anonymize_categories_column,
+    "brands": anonymize_brands,
+}
+
+
+# ============================================
+# 🔑 Card pseudonymization
+# ============================================
+
+
+CARD_KEY_ENV = "ANONIMIZATION_CARD_KEY"
+
+
+def get_card_key() -> bytes:
+    key = os.environ.get(CARD_KEY_ENV)
+    if not key:
+        raise ValueError(f"Set {CARD_KEY_ENV} to pseudonymize card numbers")
+    return key.encode()
+
+
+def normalize_card(card) -> str | None:
+    # one digit string per card however the column was typed on load:
+    # a missing card turns the column to float, 4276... into "4276....0"
+    if card is None or (isinstance(card, float) and np.isnan(card)):
+        return None
+    if isinstance(card, (float, np.floating)) and float(card).is_integer():
+        card = int(card)
+    text = "".join(str(card).split()).replace("-", "")
+    if text.lower() in ("", "nan", "none", "<na>"):
+        return None
+    if text.endswith(".0") and text[:-2].isdigit():
+        text = text[:-2]
+    return text
+
+
+def card_token(card: str, key: bytes) -> str | None:
+    card = normalize_card(card)
+    if card is None:
+        return None
+    digest = hmac.new(key, card.encode(), hashlib.sha256).hexdigest()
+    return digest[:20]
+
+
+def pseudonymize_card_number(card: str) -> str | None:
+    return card_token(card, get_card_key())
+
+
+def pseudonymize_card_numbers(column: pd.Series) -> pd.Series:
+    # each distinct card is hashed once, repeat customers are only a take
+    key = get_card_key()
+    return transform_uniques(
+        column, lambda cards: [card_token(card, key) for card in cards]
+    )
+
+
+def set_card_mode(mode: str):
+    match mode:
+        case "mask":
+            methods["cards_number"] = anonymize_card_number
+            vectorized_methods["cards_number"] = anonymize_card_numbers
+        case "pseudonymize":
+            get_card_key()
+            methods["cards_number"] = pseudonymize_card_number
+            vectorized_methods["cards_number"] = pseudonymize_card_numbers
+        case _:
+            raise ValueError(f"Unknown card mode: {mode}")
+
+
 # ============================================
 # ⚙️ Data Processing
 # ============================================
 
 
 def get_good_k(table: pd.DataFrame) -> int:
-    rows = len(table)
+    return get_good_k_for_rows(len(table))
 
+
+def get_good_k_for_rows(rows: int) -> int:
     match rows:
         case n if n <= 51000:
             return 10
         case n if n <= 105000:
             return 7
-        case n if n <= 260000:
+        case _:
+            # a fixed floor, extracts past 105000 rows all need classes of five
             return 5
 
 
-def anonymize_column(table: pd.DataFrame, column: str) -> pd.DataFrame:
-    table[column] = table[column].apply(methods[column])
+def anonymize_column(
+    table: pd.DataFrame, column: str, vectorized: bool = True
+) -> pd.DataFrame:
+    # column may be left out by column projection on load
+    if column not in table.columns:
+        return table
+    with profiling.stage(f"anonymize {column}", len(table)):
+        if vectorized:
+            table[column] = vectorized_methods[column](table[column])
+        else:
+            table[column] = table[column].apply(methods[column])
     return table
 
 
-def anonymize_direct_identifiers(table: pd.DataFrame) -> pd.DataFrame:
-    table = anonymize_column(table, "cards_number")
+def anonymize_direct_identifiers(
+    table: pd.DataFrame, vectorized: bool = True
+) -> pd.DataFrame:
+    table = anonymize_column(table, "cards_number", vectorized)
 
-    table = table.drop("receipt_id", axis=1)
+    table = table.drop("receipt_id", axis=1, errors="ignore")
     return table
 
 
+def get_group_sizes(table: pd.DataFrame, quasi_ids: list[str]) -> pd.Series:
+    with profiling.stage("group sizes", len(table)):
+        return table.groupby(quasi_ids, observed=True, sort=False).size()
+
+
+def k_anonymity_from_histogram(
+    histogram: pd.Series, total: int, k: int | None = None
+) -> dict:
+    # histogram: number of groups for each group size, k defaults to the
+    # policy for this many rows
+    k = k or get_good_k_for_rows(total)
+
+    # rows per group size: number of groups of size n times n
+    rows_per_size = pd.Series(
+        histogram.index.to_numpy() * histogram.to_numpy(), index=histogram.index
+    ).sort_index()
+
+    number_good = int(rows_per_size[rows_per_size.index >= k].sum())
+    bad_sizes = rows_per_size[rows_per_size.index < k]
+
+    return {
+        "k": k,
+        "rows": total,
+        "groups": int(histogram.sum()),
+        "rows_good": number_good,
+        "unique_rows": int(histogram.get(1, 0)),
+        "fraction_good": number_good / total * 100 if total else 0.0,
+        "bad_k": [
+            [int(size), int(rows) / total * 100] for size, rows in bad_sizes.items()
+        ],
+    }
+
+
+def k_anonymity_from_group_sizes(
+    group_sizes: pd.Series, total: int, k: int | None = None
+) -> dict:
+    return k_anonymity_from_histogram(group_sizes.value_counts(), total, k)
+
+
+def k_anonymity_report(
+    table: pd.DataFrame, quasi_ids: list[str], k: int | None = None
+) -> dict:
+    return k_anonymity_from_group_sizes(
+        get_group_sizes(table, quasi_ids), len(table), k
+    )
+
+
+def format_k_anonymity(report: dict) -> tuple:
+    # the five lowest bad k values, as shown by print_result
+    bad_group_list = [
+        [bad_k, f"{fraction_bad:.2f}%"] for bad_k, fraction_bad in report["bad_k"][:5]
+    ]
+    return (f"{report['fraction_good']:.2f}%", f"{report['k']}", bad_group_list)
+
+
 def get_k_anonymity(table: pd.DataFrame, quasi_ids: list[str]) -> tuple:
-    # count k
-    grouped = table.groupby(quasi_ids).size().rename("group_size").reset_index()
+    return format_k_anonymity(k_anonymity_report(table, quasi_ids))
 
-    # lowest good k-anonymity
-    k = get_good_k(table)
 
-    # add sizes of groups to table
-    table_with_sizes = table.merge(grouped, on=quasi_ids, how="left")
+def apply_method(method, column: pd.Series) -> pd.Series:
+    return column.apply(method)
 
-    # count % of good k group
-    number_good = (table_with_sizes["group_size"] >= k).sum()
-    total = len(table)
-    fraction_good = number_good / total * 100
 
-    # count percent of lowest k groups
-    bad_group_list = []
-    for bad_k in range(1, k):
-        total_bad = len(table_with_sizes[table_with_sizes["group_size"] == bad_k])
-        fraction_bad = total_bad / total * 100
-        if fraction_bad == 0:
-            continue
-        bad_group_list.append([bad_k, f"{fraction_bad:.2f}%"])
-        if len(bad_group_list) == 5:
-            break
+def parallel_anonymization(
+    table: pd.DataFrame, vectorized: bool, workers: int
+) -> pd.DataFrame:
+    with profiling.stage("parallel anonymization", len(table)):
+        return run_parallel_anonymization(table, vectorized, workers)
 
-    return (f"{fraction_good:.2f}%", f"{k}", bad_group_list)
+
+def run_parallel_anonymization(
+    table: pd.DataFrame, vectorized: bool, workers: int
+) -> pd.DataFrame:
+    # columns are independent: threads for numpy/pandas paths,
+    # processes for per-value python functions
+    columns = [column for column in methods if column in table.columns]
+    if vectorized:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    with executor:
+        futures = {}
+        for column in columns:
+            if vectorized:
+                future = executor.submit(vectorized_methods[column], table[column])
+            else:
+                future = executor.submit(apply_method, methods[column], table[column])
+            futures[column] = future
+
+        table = table.drop("receipt_id", axis=1, errors="ignore")
+        for column, future in futures.items():
+            table[column] = future.result()
+    return table
 
 
-def full_anonymization(table: pd.DataFrame) -> pd.DataFrame:
-    table = anonymize_direct_identifiers(table)
+def full_anonymization(
+    table: pd.DataFrame, vectorized: bool = True, workers: int | None = None
+) -> pd.DataFrame:
+    if workers is not None and workers > 1:
+        return parallel_anonymization(table, vectorized, workers)
 
-    table = anonymize_column(table, "date-time")
+    table = anonymize_direct_identifiers(table, vectorized)
 
-    table = anonymize_column(table, "store_name")
+    table = anonymize_column(table, "date-time", vectorized)
 
-    table = anonymize_column(table, "coordinates")
+    table = anonymize_column(table, "store_name", vectorized)
 
-    table = anonymize_column(table, "total_cost")
+    table = anonymize_column(table, "coordinates", vectorized)
 
-    table = anonymize_column(table, "number_of_products")
+    table = anonymize_column(table, "total_cost", vectorized)
 
-    table = anonymize_column(table, "price")
+    table = anonymize_column(table, "number_of_products", vectorized)
 
-    table = anonymize_column(table, "categories")
+    table = anonymize_column(table, "price", vectorized)
 
-    table = anonymize_column(table, "brands")
+    table = anonymize_column(table, "categories", vectorized)
+
+    table = anonymize_column(table, "brands", vectorized)
 
     return table
 
@@ -287,14 +569,14 @@ def user_interface(table: pd.DataFrame):
     keys = input()
     quasi_ids = get_quasis(keys)
 
-    fraction, k_anonymity, bad_k = get_k_anonymity(table, quasi_ids)
+    report = k_anonymity_report(table, quasi_ids)
 
-    print_result(fraction, k_anonymity, bad_k)
+    print_result(*format_k_anonymity(report))
 
     print("Количесвто уникальных по заданным квази-идентификаторам:")
 
-    count = table.groupby(quasi_ids).ngroups
-    print(count)
+    # the report already counted the groups, no second groupby
+    print(report["groups"])
 
 
 # ============================================
@@ -308,21 +590,26 @@ def get_anonymized_columns(table: pd.DataFrame, quasi_ids: list[str]) -> tuple:
     return (unique_columns_table, count_unique_columns)
 
 
+def compare_engines(table: pd.DataFrame) -> list[str]:
+    # columns where vectorized engine differs from per-value functions
+    reference = full_anonymization(table.copy(), vectorized=False)
+    vectorized = full_anonymization(table.copy(), vectorized=True)
+
+    mismatched = []
+    for column in reference.columns:
+        expected = reference[column].astype(object)
+        actual = vectorized[column].astype(object)
+        if not expected.equals(actual):
+            mismatched.append(column)
+    return mismatched
+
+
 # ============================================
 # ▶️ Main
 # ============================================
 
 
 if __name__ == "__main__":
-    data_path = "C:\\Users\\VLAD\\prog\\Dataset_anonimization\\data\\table1.xlsx"
-    out_path = "C:\\Users\\VLAD\\prog\\Dataset_anonimization\\output\\example.xlsx"
-
-    table = Load_table(data_path)
-
-    table = table_validate(table)
-
-    table = full_anonymization(table)
-
-    export_output(table, out_path)
+    import cli
 
-    user_interface(table)
+    sys.exit(cli.main())
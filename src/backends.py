@@ -0,0 +1,345 @@
+import importlib
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+import anonimization as anon
+import profiling
+
+BACKENDS = ("pandas", "duckdb", "polars")
+
+# Excel tops out at about a million rows, out-of-core runs read columnar files
+QUERY_FORMATS = ("csv", "parquet", "feather")
+
+SPILL_DIR = Path(tempfile.gettempdir()) / "anonimization-spill"
+
+ROW_NUMBER = '"__row_number"'
+
+
+def import_backend(name: str):
+    if name not in BACKENDS[1:]:
+        raise ValueError(f"Unknown backend: {name}")
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        raise ValueError(
+            f"The {name} backend needs the {name} package: pip install {name}"
+        ) from None
+
+
+def check_format(path: str, file_format: str | None, backend: str) -> str:
+    file_format = anon.get_format(Path(path), file_format)
+    if file_format not in QUERY_FORMATS:
+        raise ValueError(
+            f"The {backend} backend reads and writes {', '.join(QUERY_FORMATS)}"
+        )
+    return file_format
+
+
+# ============================================
+# 🗺️ Generalization mappings
+# ============================================
+
+
+def build_mapping(uniques: pd.Series, column: str) -> pd.DataFrame:
+    # the pandas transform runs once per distinct value, so every backend
+    # generalizes exactly like the default path
+    generalized = anon.vectorized_methods[column](uniques.reset_index(drop=True))
+    return pd.DataFrame(
+        {"source": uniques.to_numpy(), "generalized": generalized.astype(object)}
+    )
+
+
+def get_columns(names: list[str]) -> list[str]:
+    return [column for column in anon.methods if column in names]
+
+
+def output_columns(names: list[str]) -> list[str]:
+    return [column for column in names if column != "receipt_id"]
+
+
+# ============================================
+# 🦆 DuckDB
+# ============================================
+
+
+def quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def duckdb_source(connection, path: str, file_format: str, view: str) -> str:
+    match file_format:
+        case "csv":
+            return f"read_csv({literal(path)})"
+        case "parquet":
+            return f"read_parquet({literal(path)})"
+        case "feather":
+            import pyarrow.dataset as ds
+
+            # scanned lazily by batches, like read_parquet
+            connection.register(view, ds.dataset(path, format="ipc"))
+            return view
+
+
+def literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def open_duckdb(memory_limit: str | None = None, threads: int | None = None):
+    duckdb = import_backend("duckdb")
+    SPILL_DIR.mkdir(parents=True, exist_ok=True)
+    connection = duckdb.connect()
+    connection.execute(f"SET temp_directory = {literal(SPILL_DIR)}")
+    if memory_limit:
+        connection.execute(f"SET memory_limit = {literal(memory_limit)}")
+    if threads:
+        connection.execute(f"SET threads = {int(threads)}")
+    return connection
+
+
+def duckdb_query(connection, source: str, columns: list[str] | None) -> str:
+    names = [
+        row[0]
+        for row in connection.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()
+    ]
+    if columns is not None:
+        names = [name for name in names if name in columns]
+
+    selected = []
+    joins = []
+    for name in output_columns(names):
+        if name not in anon.methods:
+            selected.append(f"source.{quote(name)}")
+            continue
+        with profiling.stage(f"distinct {name}") as record:
+            uniques = connection.execute(
+                f"SELECT DISTINCT {quote(name)} FROM {source}"
+            ).df()[name]
+            record["rows"] = len(uniques)
+            mapping = build_mapping(uniques, name)
+        view = f"mapping_{len(joins)}"
+        connection.register(view, mapping)
+        selected.append(f"{view}.generalized AS {quote(name)}")
+        joins.append(
+            f"LEFT JOIN {view} ON source.{quote(name)} "
+            f"IS NOT DISTINCT FROM {view}.source"
+        )
+    # hash joins do not keep scan order, the input row number restores it
+    numbered = f"(SELECT *, row_number() OVER () AS {ROW_NUMBER} FROM {source})"
+    return (
+        f"SELECT {', '.join(selected)} FROM {numbered} AS source "
+        f"{' '.join(joins)} ORDER BY source.{ROW_NUMBER}"
+    )
+
+
+def duckdb_histogram(connection, relation: str, quasi_ids: list[str]) -> pd.Series:
+    groups = ", ".join(quote(column) for column in quasi_ids)
+    # like pandas groupby, rows with a missing quasi-identifier form no class
+    present = " AND ".join(f"{quote(column)} IS NOT NULL" for column in quasi_ids)
+    histogram = connection.execute(
+        f"SELECT size, count(*) AS groups FROM "
+        f"(SELECT count(*) AS size FROM {relation} WHERE {present} "
+        f"GROUP BY {groups}) GROUP BY size"
+    ).df()
+    return pd.Series(histogram["groups"].to_numpy(), index=histogram["size"])
+
+
+def duckdb_export(connection, query: str, out_path: str, out_format: str):
+    match out_format:
+        case "csv":
+            connection.execute(f"COPY ({query}) TO {literal(out_path)} (HEADER)")
+        case "parquet":
+            connection.execute(
+                f"COPY ({query}) TO {literal(out_path)} (FORMAT parquet)"
+            )
+        case "feather":
+            import pyarrow as pa
+
+            reader = connection.execute(query).fetch_record_batch()
+            with pa.ipc.new_file(out_path, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+
+
+def run_duckdb(
+    in_path: str,
+    out_path: str | None,
+    quasi_ids: list[str] | None,
+    in_format: str,
+    out_format: str | None,
+    memory_limit: str | None = None,
+    threads: int | None = None,
+) -> dict | None:
+    connection = open_duckdb(memory_limit, threads)
+    try:
+        source = duckdb_source(connection, in_path, in_format, "input_table")
+        columns = None if out_path else quasi_ids
+        query = duckdb_query(connection, source, columns)
+
+        if out_path:
+            with profiling.stage("export"):
+                duckdb_export(connection, query, out_path, out_format)
+            # counting the written file skips a second pass of the joins
+            output = duckdb_source(connection, out_path, out_format, "output_table")
+            query = f"SELECT * FROM {output}"
+        if not quasi_ids:
+            return None
+
+        with profiling.stage("group sizes"):
+            connection.execute(f"CREATE TEMP VIEW anonymized AS {query}")
+            total = connection.execute("SELECT count(*) FROM anonymized").fetchone()[0]
+            histogram = duckdb_histogram(connection, "anonymized", quasi_ids)
+    finally:
+        connection.close()
+    if total == 0:
+        return None
+    return anon.k_anonymity_from_histogram(histogram, total)
+
+
+# ============================================
+# 🐻‍❄️ Polars
+# ============================================
+
+
+def polars_scan(path: str, file_format: str):
+    pl = import_backend("polars")
+    match file_format:
+        case "csv":
+            return pl.scan_csv(path)
+        case "parquet":
+            return pl.scan_parquet(path)
+        case "feather":
+            return pl.scan_ipc(path)
+
+
+def polars_query(frame, columns: list[str] | None):
+    pl = import_backend("polars")
+    names = frame.collect_schema().names()
+    if columns is not None:
+        names = [name for name in names if name in columns]
+    frame = frame.select(output_columns(names))
+
+    # Parquet written by pandas stores categoricals, the mappings hold strings
+    schema = frame.collect_schema()
+    categorical = [
+        name
+        for name, dtype in schema.items()
+        if isinstance(dtype, (pl.Categorical, pl.Enum))
+    ]
+    frame = frame.with_columns(pl.col(categorical).cast(pl.String))
+
+    source = frame
+    for name in get_columns(names):
+        with profiling.stage(f"distinct {name}") as record:
+            uniques = (
+                source.select(pl.col(name).unique())
+                .collect(engine="streaming")
+                .to_pandas()[name]
+            )
+            record["rows"] = len(uniques)
+            mapping = pl.from_pandas(build_mapping(uniques, name)).with_columns(
+                pl.col("generalized").cast(pl.String)
+            )
+        # a left join streams where replace_strict collects the column,
+        # maintain_order keeps the input row order of the pandas path
+        frame = (
+            frame.join(
+                mapping.lazy(),
+                left_on=name,
+                right_on="source",
+                how="left",
+                nulls_equal=True,
+                maintain_order="left",
+            )
+            .drop(name)
+            .rename({"generalized": name})
+        )
+    return frame.select(output_columns(names))
+
+
+def polars_export(frame, out_path: str, out_format: str):
+    match out_format:
+        case "csv":
+            frame.sink_csv(out_path)
+        case "parquet":
+            frame.sink_parquet(out_path)
+        case "feather":
+            frame.sink_ipc(out_path)
+
+
+def polars_histogram(frame, quasi_ids: list[str]) -> pd.Series:
+    pl = import_backend("polars")
+    # like pandas groupby, rows with a missing quasi-identifier form no class
+    histogram = (
+        frame.drop_nulls(quasi_ids)
+        .group_by(quasi_ids)
+        .agg(pl.len().alias("size"))
+        .group_by("size")
+        .agg(pl.len().alias("groups"))
+        .collect(engine="streaming")
+        .to_pandas()
+    )
+    return pd.Series(histogram["groups"].to_numpy(), index=histogram["size"])
+
+
+def run_polars(
+    in_path: str,
+    out_path: str | None,
+    quasi_ids: list[str] | None,
+    in_format: str,
+    out_format: str | None,
+    memory_limit: str | None = None,
+    threads: int | None = None,
+) -> dict | None:
+    # polars sizes its thread pool on import (POLARS_MAX_THREADS) and
+    # spills through the streaming engine, so both limits are left to it
+    pl = import_backend("polars")
+    frame = polars_query(
+        polars_scan(in_path, in_format), None if out_path else quasi_ids
+    )
+
+    if out_path:
+        with profiling.stage("export"):
+            polars_export(frame, out_path, out_format)
+        frame = polars_scan(out_path, out_format)
+    if not quasi_ids:
+        return None
+
+    with profiling.stage("group sizes"):
+        total = frame.select(pl.len()).collect(engine="streaming").item()
+        histogram = polars_histogram(frame, quasi_ids)
+    if total == 0:
+        return None
+    return anon.k_anonymity_from_histogram(histogram, total)
+
+
+# ============================================
+# ▶️ Run
+# ============================================
+
+
+def run_backend(
+    backend: str,
+    in_path: str,
+    out_path: str | None = None,
+    quasi_ids: list[str] | None = None,
+    in_format: str | None = None,
+    out_format: str | None = None,
+    memory_limit: str | None = None,
+    threads: int | None = None,
+) -> dict | None:
+    in_format = check_format(in_path, in_format, backend)
+    if out_path:
+        out_format = check_format(out_path, out_format, backend)
+
+    match backend:
+        case "duckdb":
+            run = run_duckdb
+        case "polars":
+            run = run_polars
+        case _:
+            raise ValueError(f"Unknown backend: {backend}")
+    return run(
+        in_path, out_path, quasi_ids, in_format, out_format, memory_limit, threads
+    )
@@ -0,0 +1,282 @@
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+import anonimization as anon
+import cli
+import suppression
+
+# rough peak memory per byte of input file while anonymizing
+MEMORY_FACTOR = {"excel": 30, "csv": 6, "parquet": 12, "feather": 4}
+
+
+# ============================================
+# 📂 Inputs and resources
+# ============================================
+
+
+def find_inputs(pattern: str) -> list[Path]:
+    path = Path(pattern)
+    if path.is_dir():
+        files = [item for item in path.iterdir() if item.suffix.lower() in anon.formats]
+    else:
+        # a glob may match notes or logs next to the tables
+        files = [
+            Path(item)
+            for item in glob.glob(pattern, recursive=True)
+            if Path(item).suffix.lower() in anon.formats and Path(item).is_file()
+        ]
+    return sorted(item for item in files if not item.name.startswith("~$"))
+
+
+def get_outputs(
+    files: list[Path], output_dir: Path, output_format: str | None = None
+) -> dict:
+    def plain_name(path: Path) -> str:
+        suffix = f".{output_format}" if output_format else path.suffix
+        return f"{path.stem}{suffix}"
+
+    names = [plain_name(path) for path in files]
+    root = Path(os.path.commonpath([path.parent.resolve() for path in files]))
+
+    outputs = {}
+    for path, name in zip(files, names):
+        if names.count(name) > 1:
+            # a.csv and a.xlsx, or sub/a.csv from a recursive glob: keep the
+            # source suffix and the directories below the common root
+            relative = path.resolve().relative_to(root)
+            name = "__".join(relative.parts)
+            if output_format:
+                name += f".{output_format}"
+        outputs[path] = output_dir / name
+
+    planned = list(outputs.values())
+    duplicates = sorted({str(item) for item in planned if planned.count(item) > 1})
+    if duplicates:
+        raise ValueError(f"Several inputs map to {', '.join(duplicates)}")
+    return outputs
+
+
+def get_available_memory() -> int | None:
+    try:
+        with open("/proc/meminfo") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def get_workers(files: list[Path], workers: int | None = None) -> int:
+    workers = workers or os.cpu_count() or 1
+
+    available = get_available_memory()
+    if available is not None and files:
+        largest = max(
+            item.stat().st_size * MEMORY_FACTOR[anon.get_format(item)] for item in files
+        )
+        workers = min(workers, max(1, available // max(largest, 1)))
+    return max(1, min(workers, len(files)))
+
+
+# ============================================
+# ⚙️ One file
+# ============================================
+
+
+def process_file(
+    path: Path,
+    output: Path,
+    quasi_ids: list[str] | None,
+    cards: str = "mask",
+    suppress: str | None = None,
+    max_suppression: float = 5.0,
+) -> dict:
+    result = {"file": str(path), "output": None, "rows": 0, "error": None}
+    try:
+        # workers may be spawned fresh, so the mode is set in each one
+        anon.set_card_mode(cards)
+        table = anon.Load_table(path)
+        anon.check_columns(table, list(anon.methods))
+        table = anon.table_validate(table)
+        table = anon.full_anonymization(table)
+        if suppress:
+            # each file is an extract of its own, with its own small classes
+            table, result["suppression"] = suppression.suppress_small_groups(
+                table, quasi_ids, max_suppression, suppress
+            )
+
+        anon.export_output(table, output)
+
+        result["output"] = str(output)
+        result["rows"] = len(table)
+        if quasi_ids:
+            result["group_sizes"] = anon.get_group_sizes(table, quasi_ids)
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+    return result
+
+
+# ============================================
+# 📊 Summary
+# ============================================
+
+
+def summarize(results: list[dict], quasi_ids: list[str] | None) -> tuple:
+    rows = []
+    combined = None
+    total = 0
+    for result in results:
+        row = {
+            "file": result["file"],
+            "output": result["output"],
+            "rows": result["rows"],
+            "error": result["error"],
+        }
+        if result["error"] is None and quasi_ids:
+            group_sizes = result["group_sizes"]
+            stats = result.get("suppression")
+            report = anon.k_anonymity_from_group_sizes(
+                group_sizes, result["rows"], stats["k"] if stats else None
+            )
+            row.update(k=report["k"], fraction_good=report["fraction_good"])
+            if stats:
+                row.update(
+                    suppressed_rows=stats["suppressed_rows"],
+                    merged_rows=stats["merged_rows"],
+                )
+
+            # equivalence classes are shared across files with equal quasi-ids
+            if combined is None:
+                combined = group_sizes
+            else:
+                combined = combined.add(group_sizes, fill_value=0).astype("int64")
+            total += result["rows"]
+        rows.append(row)
+
+    report = None
+    if combined is not None:
+        report = anon.k_anonymity_from_group_sizes(combined, total)
+    return pd.DataFrame(rows), report
+
+
+def run_batch(
+    pattern: str,
+    output_dir: str,
+    quasi_ids: list[str] | None = None,
+    output_format: str | None = None,
+    workers: int | None = None,
+    cards: str = "mask",
+    suppress: str | None = None,
+    max_suppression: float = 5.0,
+) -> tuple:
+    files = find_inputs(pattern)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if not files:
+        return summarize([], quasi_ids)
+    outputs = get_outputs(files, output_dir, output_format)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=get_workers(files, workers)) as executor:
+        futures = {
+            executor.submit(
+                process_file,
+                path,
+                outputs[path],
+                quasi_ids,
+                cards,
+                suppress,
+                max_suppression,
+            ): path
+            for path in files
+        }
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as error:
+                # the worker itself died, e.g. out of memory
+                results.append(
+                    {
+                        "file": str(futures[future]),
+                        "output": None,
+                        "rows": 0,
+                        "error": f"{type(error).__name__}: {error}",
+                    }
+                )
+
+    results.sort(key=lambda result: result["file"])
+    return summarize(results, quasi_ids)
+
+
+# ============================================
+# ▶️ Main
+# ============================================
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="batch", description="Anonymize many tables in parallel."
+    )
+    parser.add_argument("inputs", help="directory or glob of input tables")
+    parser.add_argument("-o", "--output-dir", required=True)
+    parser.add_argument("--output-format", help="extension of outputs, e.g. parquet")
+    parser.add_argument("-q", "--quasi-ids", help="quasi-identifiers for the summary")
+    parser.add_argument("-j", "--workers", type=int, help="process limit")
+    parser.add_argument("--cards", choices=["mask", "pseudonymize"], default="mask")
+    parser.add_argument("--summary", help="write the per-file summary table here")
+    parser.add_argument("--target", type=float, default=100.0)
+    parser.add_argument(
+        "--suppress",
+        choices=["suppress", "merge"],
+        help="act on the small classes of each file, needs --quasi-ids",
+    )
+    parser.add_argument("--max-suppression", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    try:
+        quasi_ids = cli.parse_quasi_ids(args.quasi_ids) if args.quasi_ids else None
+        if args.suppress and not quasi_ids:
+            raise ValueError("--suppress needs --quasi-ids")
+        anon.set_card_mode(args.cards)
+    except ValueError as error:
+        print(f"batch: {error}", file=sys.stderr)
+        return cli.EXIT_USAGE
+
+    try:
+        summary, report = run_batch(
+            args.inputs,
+            args.output_dir,
+            quasi_ids,
+            args.output_format,
+            args.workers,
+            args.cards,
+            args.suppress,
+            args.max_suppression,
+        )
+    except ValueError as error:
+        print(f"batch: {error}", file=sys.stderr)
+        return cli.EXIT_USAGE
+    print(summary.to_string(index=False))
+    if args.summary:
+        anon.export_output(summary, args.summary)
+
+    if report is not None:
+        print("Все файлы вместе:")
+        anon.print_result(*anon.format_k_anonymity(report))
+
+    if summary.empty or summary["error"].notna().any():
+        return cli.EXIT_FAILURE
+    if report is not None and (summary["fraction_good"] < args.target).any():
+        return cli.EXIT_K_NOT_MET
+    return cli.EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
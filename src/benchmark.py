@@ -0,0 +1,156 @@
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+import anonimization as anon
+import profiling
+import synthetic
+
+DEFAULT_QUASI_IDS = ["store_name", "date-time", "coordinates", "price"]
+
+
+# ============================================
+# ⏱️ Measurements
+# ============================================
+
+
+def measure(results: list, rows: int, stage: str, function, *args, **kwargs):
+    # tracemalloc slows allocation-heavy stages several times over, so
+    # timings come from an untraced pass and peaks from a separate one
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    value = function(*args, **kwargs)
+    seconds = time.perf_counter() - start
+
+    results.append(
+        {
+            "rows": rows,
+            "stage": stage,
+            "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds else float("inf"),
+            "peak_mb": tracemalloc.get_traced_memory()[1] / 2**20 if tracing else None,
+        }
+    )
+    return value
+
+
+def benchmark_rows(
+    rows: int,
+    workdir: Path,
+    file_format: str,
+    quasi_ids: list[str],
+    reference: bool,
+) -> list:
+    results = []
+    in_path = workdir / f"receipts_{rows}.{file_format}"
+    out_path = workdir / f"anonymized_{rows}.{file_format}"
+    synthetic.write_receipts(in_path, rows)
+
+    table = measure(results, rows, "load", anon.Load_table, in_path)
+    table = measure(results, rows, "table_validate", anon.table_validate, table)
+
+    for column in anon.methods:
+        measure(
+            results,
+            rows,
+            f"vectorized {column}",
+            anon.vectorized_methods[column],
+            table[column],
+        )
+        if reference:
+            measure(
+                results,
+                rows,
+                f"reference {column}",
+                table[column].apply,
+                anon.methods[column],
+            )
+
+    anonymized = measure(
+        results, rows, "full_anonymization", anon.full_anonymization, table.copy()
+    )
+    measure(
+        results, rows, "get_k_anonymity", anon.get_k_anonymity, anonymized, quasi_ids
+    )
+    measure(results, rows, "export", anon.export_output, anonymized, out_path)
+    return results
+
+
+def run_benchmarks(
+    sizes: list[int],
+    file_format: str = "parquet",
+    quasi_ids: list[str] | None = None,
+    reference: bool = False,
+    memory: bool = False,
+) -> pd.DataFrame:
+    quasi_ids = quasi_ids or DEFAULT_QUASI_IDS
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in sizes:
+            timed = benchmark_rows(
+                rows, Path(workdir), file_format, quasi_ids, reference
+            )
+            if memory:
+                tracemalloc.start()
+                try:
+                    traced = benchmark_rows(
+                        rows, Path(workdir), file_format, quasi_ids, reference
+                    )
+                finally:
+                    tracemalloc.stop()
+                for result, traced_result in zip(timed, traced):
+                    result["peak_mb"] = traced_result["peak_mb"]
+            results.extend(timed)
+
+    table = pd.DataFrame(results)
+    # peak resident memory of the whole process, None where it is unknown
+    rss = profiling.max_rss()
+    table.attrs["max_rss_mb"] = rss / (1 << 20) if rss is not None else None
+    return table
+
+
+# ============================================
+# ▶️ Main
+# ============================================
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmark", description="Time the pipeline on synthetic receipts."
+    )
+    parser.add_argument(
+        "-n", "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--format", default="parquet", help="input and output format")
+    parser.add_argument("-q", "--quasi-ids", nargs="+", default=DEFAULT_QUASI_IDS)
+    parser.add_argument(
+        "--reference", action="store_true", help="also time the per-value functions"
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="add traced peak memory per stage, from a second untimed pass",
+    )
+    parser.add_argument("-o", "--output", help="save results as csv, parquet or xlsx")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        args.rows, args.format, args.quasi_ids, args.reference, args.memory
+    )
+    print(results.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    if results.attrs["max_rss_mb"] is not None:
+        print(f"max RSS: {results.attrs['max_rss_mb']:.1f} MB")
+    if args.output:
+        anon.export_output(results, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import bisect
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BINS_PATH = Path(__file__).with_name("bins.json")
+
+
+# ============================================
+# 📏 Bin specifications
+# ============================================
+
+
+def validate_bins(column: str, spec: dict):
+    edges = spec["edges"]
+    if len(spec["labels"]) != len(edges) + 1:
+        raise ValueError(
+            f"{column}: need {len(edges) + 1} labels for {len(edges)} edges"
+        )
+    if list(edges) != sorted(edges) or len(set(edges)) != len(edges):
+        raise ValueError(f"{column}: edges must be strictly increasing")
+    if edges and spec["lower"] > edges[0]:
+        raise ValueError(f"{column}: lower bound is above the first edge")
+
+
+def load_bins(path: str | Path = BINS_PATH) -> dict:
+    with open(path, encoding="utf-8") as file:
+        bins = json.load(file)
+
+    for column, spec in bins.items():
+        spec.setdefault("out_of_range", "unknown")
+        validate_bins(column, spec)
+    return bins
+
+
+bins = load_bins()
+
+
+# ============================================
+# 🧮 Range generalization
+# ============================================
+
+
+def bin_codes(values: np.ndarray, spec: dict) -> np.ndarray:
+    # interval i is (edges[i-1], edges[i]], the last one is open to the right
+    codes = np.searchsorted(np.asarray(spec["edges"], dtype=float), values, side="left")
+    out_of_range = np.isnan(values) | (values < spec["lower"])
+    codes[out_of_range] = len(spec["labels"])
+    return codes
+
+
+def generalize_value(value, spec: dict) -> str:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return spec["out_of_range"]
+    if math.isnan(value) or value < spec["lower"]:
+        return spec["out_of_range"]
+    return spec["labels"][bisect.bisect_left(spec["edges"], value)]
+
+
+def generalize_range(column: pd.Series, spec: dict) -> pd.Series:
+    values = pd.to_numeric(column, errors="coerce")
+    values = values.to_numpy(dtype=float, na_value=np.nan)
+
+    # labels may repeat to merge intervals, categories must be unique
+    labels = spec["labels"] + [spec["out_of_range"]]
+    categories = list(dict.fromkeys(labels))
+    remap = np.array([categories.index(label) for label in labels])
+
+    generalized = pd.Categorical.from_codes(
+        remap[bin_codes(values, spec)], categories=categories
+    )
+    return pd.Series(generalized, index=column.index, name=column.name)
@@ -0,0 +1,51 @@
+import argparse
+import sys
+from pathlib import Path
+
+import anonimization as anon
+import cli
+
+DEFAULT_INPUT = Path(__file__).resolve().parent.parent / "data" / "table.xlsx"
+
+
+# ============================================
+# ✅ Engine equivalence
+# ============================================
+
+
+def check_engines(path: str, file_format: str | None = None) -> list[str]:
+    table = anon.Load_table(path, anon.get_projection(), file_format)
+    return anon.compare_engines(anon.table_validate(table))
+
+
+# ============================================
+# ▶️ Main
+# ============================================
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="check_engines",
+        description="Check that the vectorized engine matches the per-value functions.",
+    )
+    parser.add_argument("input", nargs="?", default=str(DEFAULT_INPUT))
+    parser.add_argument("--format", help="input format, by extension if omitted")
+    parser.add_argument("--cards", choices=["mask", "pseudonymize"], default="mask")
+    args = parser.parse_args(argv)
+
+    try:
+        anon.set_card_mode(args.cards)
+        mismatched = check_engines(args.input, args.format)
+    except (OSError, ValueError) as error:
+        print(f"check_engines: {error}", file=sys.stderr)
+        return cli.EXIT_USAGE
+
+    if mismatched:
+        print(f"Движки расходятся в столбцах: {', '.join(mismatched)}")
+        return cli.EXIT_FAILURE
+    print("Движки совпадают")
+    return cli.EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+import argparse
+import json
+import sys
+import tomllib
+from pathlib import Path
+
+import anonimization as anon
+import backends
+import incremental
+import lookup_tables
+import privacy_metrics
+import profiling
+import result_cache
+import risk
+import session
+import streaming
+import suppression
+
+# 1 is what Python exits with on an uncaught exception, so a crash can
+# never read as "k not met"
+EXIT_OK = 0
+EXIT_USAGE = 2
+EXIT_FAILURE = 3
+EXIT_K_NOT_MET = 4
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_INPUT = ROOT / "data" / "table1.xlsx"
+
+
+# ============================================
+# ⚙️ Configuration
+# ============================================
+
+
+def load_config(path: str) -> dict:
+    path = Path(path)
+    match path.suffix.lower():
+        case ".toml":
+            with open(path, "rb") as file:
+                return tomllib.load(file)
+        case ".yaml" | ".yml":
+            import yaml
+
+            with open(path, encoding="utf-8") as file:
+                return yaml.safe_load(file) or {}
+        case suffix:
+            raise ValueError(f"Unknown config format: {suffix}")
+
+
+def parse_quasi_ids(value) -> list[str]:
+    # numbers as in user_interface, or column names
+    if isinstance(value, str):
+        value = value.replace(",", " ").split()
+    quasi_ids = []
+    for key in value:
+        key = str(key)
+        try:
+            column = anon.get_quasis(key)[0] if key.isdigit() else key
+        except KeyError:
+            raise ValueError(f"Unknown quasi-identifier: {key}") from None
+        if column not in anon.methods:
+            raise ValueError(f"Unknown quasi-identifier: {key}")
+        quasi_ids.append(column)
+    return quasi_ids
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="anonimization",
+        description="Anonymize a receipts table and report its k-anonymity.",
+        epilog=(
+            f"exit codes: {EXIT_OK} ok, {EXIT_USAGE} usage error, "
+            f"{EXIT_FAILURE} failure, {EXIT_K_NOT_MET} k-anonymity target not met"
+        ),
+    )
+    parser.add_argument("-c", "--config", help="TOML or YAML file with these options")
+    parser.add_argument("-i", "--input", help="input table")
+    parser.add_argument("-o", "--output", help="anonymized output table")
+    parser.add_argument("--format", help="input format, by extension if omitted")
+    parser.add_argument(
+        "--output-format", help="output format, by extension if omitted"
+    )
+    parser.add_argument(
+        "-q",
+        "--quasi-ids",
+        help='quasi-identifiers as numbers ("1 2 5") or column names',
+    )
+    parser.add_argument("-m", "--mode", choices=["anonymize", "report", "both"])
+    parser.add_argument(
+        "--cards",
+        choices=["mask", "pseudonymize"],
+        help=f"keep the BIN, or HMAC tokens keyed by ${anon.CARD_KEY_ENV}",
+    )
+    parser.add_argument(
+        "--target",
+        type=float,
+        help="required percent of rows in groups with k >= good k (default 100)",
+    )
+    parser.add_argument("--chunksize", type=int, help="stream the input in row chunks")
+    parser.add_argument(
+        "-j", "--workers", type=int, help="anonymize columns concurrently"
+    )
+    parser.add_argument("--report-json", help="write the k-anonymity report as JSON")
+    parser.add_argument(
+        "--sensitive",
+        help="sensitive columns for l-diversity and t-closeness, e.g. categories",
+    )
+    parser.add_argument("--l", type=int, help="required l-diversity (default 2)")
+    parser.add_argument("--t", type=float, help="required t-closeness (default 0.2)")
+    parser.add_argument(
+        "--risk",
+        choices=["exact", "approximate"],
+        help="add re-identification risk, approximate samples records and streams",
+    )
+    parser.add_argument(
+        "--sampling-fraction",
+        type=float,
+        help="share of the population in the extract, for journalist risk",
+    )
+    parser.add_argument(
+        "--suppress",
+        choices=["suppress", "merge"],
+        help="remove small classes, or merge them into the nearest class of size k",
+    )
+    parser.add_argument(
+        "--max-suppression",
+        type=float,
+        help="percent of rows --suppress may act on (default 5)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=backends.BACKENDS,
+        help="run out of core as a duckdb or polars query (default pandas)",
+    )
+    parser.add_argument(
+        "--memory-limit", help="memory limit of the duckdb backend, e.g. 2GB"
+    )
+    parser.add_argument(
+        "--state",
+        help="SQLite file with group counts of earlier extracts, report cumulatively",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="rerun even if this input and configuration were seen before",
+    )
+    parser.add_argument(
+        "--cache-size", type=int, help="result cache limit in MB (default 2048)"
+    )
+    parser.add_argument(
+        "--profile", help="write stage timings as JSON lines, or Prometheus for .prom"
+    )
+    parser.add_argument(
+        "--tracemalloc", action="store_true", help="add traced memory to --profile"
+    )
+    parser.add_argument("--cprofile", help="write cProfile stats of the run here")
+    parser.add_argument(
+        "--interactive",
+        action="store_true",
+        help="ask for quasi-identifiers on stdin after anonymization",
+    )
+    parser.add_argument(
+        "--session",
+        action="store_true",
+        help="explore quasi-identifier sets on stdin, with undo and compare",
+    )
+    return parser
+
+
+def get_options(argv: list[str] | None = None) -> dict:
+    args = build_parser().parse_args(argv)
+
+    options = {
+        "input": str(DEFAULT_INPUT),
+        "output": None,
+        "format": None,
+        "output_format": None,
+        "quasi_ids": None,
+        "mode": "both",
+        "cards": "mask",
+        "target": 100.0,
+        "chunksize": None,
+        "workers": None,
+        "report_json": None,
+        "state": None,
+        "sensitive": None,
+        "l": 2,
+        "t": 0.2,
+        "risk": None,
+        "sampling_fraction": 1.0,
+        "suppress": None,
+        "max_suppression": 5.0,
+        "backend": "pandas",
+        "memory_limit": None,
+        "interactive": False,
+        "session": False,
+        "no_cache": False,
+        "cache_size": result_cache.MAX_CACHE_BYTES >> 20,
+        "profile": None,
+        "tracemalloc": False,
+        "cprofile": None,
+    }
+    if args.config:
+        config = load_config(args.config)
+        unknown = set(config) - set(options)
+        if unknown:
+            raise ValueError(f"Unknown config options: {', '.join(sorted(unknown))}")
+        options.update(config)
+
+    # command line wins over the config file, unset flags are False and
+    # 0 == False, so identity keeps --target 0 and --workers 0
+    for key, value in vars(args).items():
+        if key != "config" and value is not None and value is not False:
+            options[key] = value
+
+    anon.set_card_mode(options["cards"])
+    if options["quasi_ids"] is not None:
+        options["quasi_ids"] = parse_quasi_ids(options["quasi_ids"])
+    if options["sensitive"] is not None:
+        options["sensitive"] = parse_quasi_ids(options["sensitive"])
+    if options["state"] and (options["sensitive"] or options["risk"]):
+        raise ValueError("--sensitive and --risk need whole tables, not --state deltas")
+    if options["chunksize"] and (options["sensitive"] or options["risk"] == "exact"):
+        raise ValueError("--sensitive and --risk exact need the whole table in memory")
+    if options["chunksize"] and (options["interactive"] or options["session"]):
+        raise ValueError("--interactive and --session need the whole table in memory")
+    if options["suppress"]:
+        if not options["quasi_ids"]:
+            raise ValueError("--suppress needs --quasi-ids")
+        if options["state"]:
+            raise ValueError("--suppress acts on whole tables, not on --state deltas")
+    if options["backend"] != "pandas":
+        if options["backend"] not in backends.BACKENDS:
+            raise ValueError(f"Unknown backend: {options['backend']}")
+        if (
+            options["state"]
+            or options["chunksize"]
+            or options["sensitive"]
+            or options["risk"]
+            or options["suppress"]
+            or options["interactive"]
+            or options["session"]
+        ):
+            raise ValueError(
+                f"The {options['backend']} backend only anonymizes and reports k"
+            )
+    if options["mode"] in ("report", "both") and not (
+        options["quasi_ids"] or options["interactive"] or options["session"]
+    ):
+        raise ValueError("Report needs --quasi-ids")
+    if options["mode"] in ("anonymize", "both") and not options["output"]:
+        raise ValueError("Anonymization needs --output, or -m report")
+    return options
+
+
+# ============================================
+# ▶️ Run
+# ============================================
+
+
+def run(options: dict) -> dict | None:
+    quasi_ids = options["quasi_ids"]
+    report_needed = options["mode"] in ("report", "both") and quasi_ids
+    export_needed = options["mode"] in ("anonymize", "both")
+
+    if options["backend"] != "pandas":
+        return backends.run_backend(
+            options["backend"],
+            options["input"],
+            options["output"] if export_needed else None,
+            quasi_ids if report_needed else None,
+            options["format"],
+            options["output_format"],
+            options["memory_limit"],
+            options["workers"],
+        )
+
+    if options["state"]:
+        if not quasi_ids:
+            raise ValueError("Incremental state needs --quasi-ids")
+        reports = incremental.run_delta(
+            options["state"],
+            options["input"],
+            options["output"] if export_needed else None,
+            [quasi_ids],
+            options["format"],
+            options["output_format"],
+        )
+        return reports[incremental.get_quasi_key(quasi_ids)]
+
+    if options["chunksize"]:
+        # suppression needs the classes even when no report is asked for,
+        # a report run streams too and only counts the groups
+        report = streaming.stream_anonymization(
+            options["input"],
+            options["output"] if export_needed else None,
+            quasi_ids if report_needed or options["suppress"] else None,
+            options["chunksize"],
+            options["format"],
+            options["output_format"],
+            options["workers"],
+            options["suppress"],
+            options["max_suppression"],
+            bool(report_needed) and options["risk"] == "approximate",
+            options["sampling_fraction"],
+        )
+        return report if report_needed else None
+
+    # a report run reads its quasi-identifiers and sensitive columns only
+    needed = None
+    if not export_needed:
+        needed = quasi_ids + (options["sensitive"] or [])
+    columns = anon.get_projection(needed)
+    table = anon.Load_table(options["input"], columns, options["format"])
+    table = anon.table_validate(table)
+    table = anon.full_anonymization(table, workers=options["workers"])
+
+    # the report keeps the k the stage suppressed for, fewer rows left
+    # could otherwise raise it
+    stats, k = None, None
+    if options["suppress"]:
+        table, stats = suppression.suppress_small_groups(
+            table, quasi_ids, options["max_suppression"], options["suppress"]
+        )
+        k = stats["k"]
+
+    report = None
+    if report_needed and options["sensitive"]:
+        report = privacy_metrics.privacy_report(
+            table, quasi_ids, options["sensitive"], options["l"], options["t"], k
+        )
+    elif report_needed:
+        report = anon.k_anonymity_report(table, quasi_ids, k)
+    if report is not None and stats is not None:
+        report["suppression"] = stats
+
+    # an Excel output carries the report as extra sheets
+    if export_needed:
+        anon.export_output(
+            table, options["output"], options["output_format"], report, quasi_ids
+        )
+    if options["interactive"]:
+        anon.user_interface(table)
+    if options["session"]:
+        session.run_session(session.Session(table))
+    if not report_needed:
+        return None
+
+    match options["risk"]:
+        case "exact":
+            report["risk"] = risk.exact_risk(
+                table, quasi_ids, options["sampling_fraction"], report["k"]
+            )[1]
+        case "approximate":
+            report["risk"] = risk.approximate_risk(
+                table,
+                quasi_ids,
+                sampling_fraction=options["sampling_fraction"],
+                k=report["k"],
+            )
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    try:
+        options = get_options(argv)
+    except (OSError, ValueError, tomllib.TOMLDecodeError) as error:
+        print(f"anonimization: {error}", file=sys.stderr)
+        return EXIT_USAGE
+
+    if options["profile"] or options["cprofile"]:
+        profiling.enable(options["tracemalloc"], bool(options["cprofile"]))
+    try:
+        if (
+            options["no_cache"]
+            or options["state"]
+            or options["interactive"]
+            or options["session"]
+        ):
+            report = run(options)
+        else:
+            report = result_cache.cached_run(run, options, options["cache_size"] << 20)
+    except Exception as error:
+        # a bug or a missing optional package is a failure, not a k verdict
+        print(f"anonimization: {type(error).__name__}: {error}", file=sys.stderr)
+        return EXIT_FAILURE
+    finally:
+        profiling.disable()
+        if options["profile"]:
+            profiling.write_report(options["profile"])
+        if options["cprofile"]:
+            profiling.dump_profile(options["cprofile"])
+
+    unknowns = lookup_tables.get_unknowns_report()
+    if len(unknowns):
+        print(f"Значения не найдены в словарях: {len(unknowns)}", file=sys.stderr)
+        print(unknowns.to_string(index=False), file=sys.stderr)
+
+    if report is None:
+        return EXIT_OK
+
+    anon.print_result(*anon.format_k_anonymity(report))
+    if "suppression" in report:
+        suppression.print_suppression(report["suppression"])
+    if "sensitive" in report:
+        privacy_metrics.print_privacy(report)
+    if "risk" in report:
+        risk.print_risk(report["risk"])
+    if options["report_json"]:
+        with open(options["report_json"], "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if report["fraction_good"] < options["target"]:
+        return EXIT_K_NOT_MET
+    return EXIT_OK
@@ -0,0 +1,348 @@
+import argparse
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import anonimization as anon
+import binning
+import cli
+import lookup_tables
+import quasi_search
+import suppression
+
+# ============================================
+# 🪜 Generalization hierarchies
+# ============================================
+
+
+SUPPRESSED = "*"
+
+
+def suppress(column: pd.Series) -> pd.Series:
+    return pd.Series(SUPPRESSED, index=column.index, name=column.name)
+
+
+def keep(column: pd.Series) -> pd.Series:
+    return column
+
+
+def date_level(period: str):
+    def generalize(column: pd.Series) -> pd.Series:
+        return anon.transform_uniques(
+            column,
+            lambda dates: pd.to_datetime(dates, format="ISO8601")
+            .dt.to_period(period)
+            .astype(str),
+        )
+
+    return generalize
+
+
+def get_city(district: str) -> str:
+    if district == lookup_tables.fallback:
+        return district
+    if "Ленинградская область" in district:
+        return "Ленинградская область"
+    return "Санкт-Петербург"
+
+
+def coords_to_city(column: pd.Series) -> pd.Series:
+    districts = anon.anonymize_coords_column(column)
+    return anon.transform_uniques(districts, lambda names: names.map(get_city))
+
+
+def range_level(spec: dict):
+    def generalize(column: pd.Series) -> pd.Series:
+        return binning.generalize_range(column, spec)
+
+    return generalize
+
+
+wide_ranges = {
+    "lower": 0,
+    "edges": [1000, 10000, 100000],
+    "labels": ["<=1000", "1000-10000", "10000-100000", "100000+"],
+    "out_of_range": "unknown",
+}
+
+
+# levels go from the raw value to full suppression, each one coarser
+hierarchies = {
+    "cards_number": [
+        ("card", keep),
+        ("bin", anon.anonymize_card_numbers),
+        ("suppressed", suppress),
+    ],
+    "date-time": [
+        ("minute", keep),
+        ("day", date_level("D")),
+        ("month", date_level("M")),
+        ("quarter", date_level("Q")),
+        ("year", date_level("Y")),
+        ("suppressed", suppress),
+    ],
+    "store_name": [
+        ("store", keep),
+        ("chain", anon.anonymize_stores),
+        ("suppressed", suppress),
+    ],
+    "coordinates": [
+        ("coordinates", keep),
+        ("district", anon.anonymize_coords_column),
+        ("city", coords_to_city),
+        ("suppressed", suppress),
+    ],
+    "categories": [
+        ("product", keep),
+        ("category", anon.anonymize_categories_column),
+        ("suppressed", suppress),
+    ],
+    "brands": [
+        ("brand", keep),
+        ("segment", anon.anonymize_brands),
+        ("suppressed", suppress),
+    ],
+    "price": [
+        ("value", keep),
+        ("range", range_level(binning.bins["price"])),
+        ("wide range", range_level(wide_ranges)),
+        ("suppressed", suppress),
+    ],
+    "total_cost": [
+        ("value", keep),
+        ("range", range_level(binning.bins["total_cost"])),
+        ("wide range", range_level(wide_ranges)),
+        ("suppressed", suppress),
+    ],
+    "number_of_products": [
+        ("value", keep),
+        ("range", range_level(binning.bins["number_of_products"])),
+        ("suppressed", suppress),
+    ],
+}
+
+
+def apply_generalization(table: pd.DataFrame, levels: dict) -> pd.DataFrame:
+    table = table.copy()
+    for column, level in levels.items():
+        names = [name for name, _ in hierarchies[column]]
+        generalize = hierarchies[column][names.index(level)][1]
+        table[column] = generalize(table[column])
+    return table
+
+
+# ============================================
+# 🔍 Lattice search
+# ============================================
+
+
+class HierarchySearch:
+    def __init__(self, table: pd.DataFrame, quasi_ids: list[str]):
+        self.table = table
+        self.quasi_ids = quasi_ids
+        self.total = len(table)
+        self.heights = [len(hierarchies[column]) for column in quasi_ids]
+        self.k = anon.get_good_k_for_rows(self.total)
+
+        # per-search cache, so finished searches release their arrays
+        self.level_codes = lru_cache(maxsize=None)(self.level_codes)
+
+    def level_codes(self, index: int, level: int) -> tuple:
+        column = self.quasi_ids[index]
+        generalize = hierarchies[column][level][1]
+        codes, uniques = pd.factorize(generalize(self.table[column]))
+        return codes.astype("int64"), len(uniques)
+
+    def report(self, node: tuple) -> dict:
+        ids, _ = self.level_codes(0, node[0])
+        for index, level in enumerate(node[1:], 1):
+            codes, cardinality = self.level_codes(index, level)
+            ids = quasi_search.combine_codes(ids, codes, cardinality)
+        return quasi_search.summarize_ids(ids, self.total)
+
+    def loss(self, node: tuple) -> float:
+        # mean share of each hierarchy climbed, 0 is raw data
+        return sum(
+            level / (height - 1) for level, height in zip(node, self.heights)
+        ) / len(node)
+
+    def passes(self, ids: np.ndarray, max_suppression: float) -> bool:
+        # the fraction_good test of the report, without building the report
+        group_sizes = np.bincount(ids[ids >= 0])
+        rows_good = int(group_sizes[group_sizes >= self.k].sum())
+        return 100 - rows_good / self.total * 100 <= max_suppression
+
+    def prefix_ids(self, columns: tuple, node: tuple, stack: list):
+        # stack keeps (level, ids) along the last node, so a lexicographic
+        # walk only recombines the columns after the shared prefix
+        shared = 0
+        while shared < len(stack) and stack[shared][0] == node[shared]:
+            shared += 1
+        del stack[shared:]
+        for at in range(shared, len(node)):
+            codes, cardinality = self.level_codes(columns[at], node[at])
+            if at:
+                codes = quasi_search.combine_codes(stack[-1][1], codes, cardinality)
+            stack.append((node[at], codes))
+        return stack[-1][1]
+
+    def extend_subset(
+        self, prefix: tuple, prefix_nodes: dict, smaller: dict, max_suppression: float
+    ) -> dict:
+        # every subset prefix + (column,) with a column after the prefix,
+        # the value is true for evaluated, that is minimal, passing nodes
+        extensions = range(prefix[-1] + 1 if prefix else 0, len(self.quasi_ids))
+        found = {prefix + (column,): {} for column in extensions}
+        stack = []
+
+        # Incognito: a node passes only if its projections pass, so only
+        # passing nodes of the prefix subset are extended; their order is
+        # lexicographic, which visits every predecessor of a node before it
+        for prefix_node in prefix_nodes:
+            ids = None
+            for column in extensions:
+                columns = prefix + (column,)
+                passing = found[columns]
+                projections = [
+                    (at, columns[:at] + columns[at + 1 :]) for at in range(len(prefix))
+                ]
+                for level in range(self.heights[column]):
+                    node = prefix_node + (level,)
+                    if any(
+                        node[:at] + node[at + 1 :] not in smaller[projection]
+                        for at, projection in projections
+                    ):
+                        continue
+                    # monotonicity: anything above a passing node passes too
+                    if any(
+                        node[:at] + (value - 1,) + node[at + 1 :] in passing
+                        for at, value in enumerate(node)
+                        if value
+                    ):
+                        passing[node] = False
+                        continue
+
+                    codes, cardinality = self.level_codes(column, level)
+                    if prefix:
+                        if ids is None:
+                            ids = self.prefix_ids(prefix, prefix_node, stack)
+                        codes = quasi_search.combine_codes(ids, codes, cardinality)
+                    if self.passes(codes, max_suppression):
+                        passing[node] = True
+        return found
+
+    def minimal_nodes(self, max_suppression: float = 0.0) -> list:
+        # column subsets bottom-up, each grown from its subset without the
+        # last column, so prefix ids are shared by all its extensions
+        smaller = {(): {(): True}}
+        for _ in self.quasi_ids:
+            current = {}
+            for prefix, prefix_nodes in smaller.items():
+                current.update(
+                    self.extend_subset(prefix, prefix_nodes, smaller, max_suppression)
+                )
+            if not all(current.values()):
+                # no generalization of the full set can pass either
+                return []
+            smaller = current
+
+        (passing,) = smaller.values()
+        return [
+            (node, self.report(node)) for node, minimal in passing.items() if minimal
+        ]
+
+    def levels(self, node: tuple) -> dict:
+        return {
+            column: hierarchies[column][level][0]
+            for column, level in zip(self.quasi_ids, node)
+        }
+
+
+def find_generalization(
+    table: pd.DataFrame, quasi_ids: list[str], max_suppression: float = 0.0
+) -> dict | None:
+    search = HierarchySearch(table, quasi_ids)
+    found = search.minimal_nodes(max_suppression)
+    if not found:
+        return None
+
+    node, report = min(
+        found, key=lambda item: (search.loss(item[0]), -item[1]["fraction_good"])
+    )
+    return {
+        "levels": search.levels(node),
+        "loss": search.loss(node),
+        "report": report,
+        "alternatives": len(found),
+    }
+
+
+def generalize_table(
+    table: pd.DataFrame, quasi_ids: list[str], result: dict, max_suppression: float
+) -> tuple:
+    # the found levels for the quasi-identifiers, the usual ones elsewhere
+    table = apply_generalization(table, result["levels"])
+    for column in anon.methods:
+        if column not in quasi_ids:
+            table = anon.anonymize_column(table, column)
+    # rows the search let stay in small classes go, within the same budget
+    return suppression.suppress_small_groups(
+        table, quasi_ids, max_suppression, "suppress", result["report"]["k"]
+    )
+
+
+# ============================================
+# ▶️ Main
+# ============================================
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="hierarchies",
+        description="Find the least generalization of the quasi-identifiers that reaches k.",
+    )
+    parser.add_argument("input", help="input table")
+    parser.add_argument("-q", "--quasi-ids", required=True)
+    parser.add_argument("--format", help="input format, by extension if omitted")
+    parser.add_argument("--cards", choices=["mask", "pseudonymize"], default="mask")
+    parser.add_argument(
+        "--max-suppression",
+        type=float,
+        default=0.0,
+        help="percent of rows that may stay in small classes and are removed",
+    )
+    parser.add_argument("-o", "--output", help="write the generalized table")
+    args = parser.parse_args(argv)
+
+    try:
+        anon.set_card_mode(args.cards)
+        quasi_ids = cli.parse_quasi_ids(args.quasi_ids)
+        table = anon.Load_table(args.input, anon.get_projection(), args.format)
+    except (OSError, ValueError) as error:
+        print(f"hierarchies: {error}", file=sys.stderr)
+        return cli.EXIT_USAGE
+
+    table = anon.table_validate(table)
+    result = find_generalization(table, quasi_ids, args.max_suppression)
+    if result is None:
+        print("Ни одно обобщение не достигает k")
+        return cli.EXIT_K_NOT_MET
+
+    for column, level in result["levels"].items():
+        print(f"{column}: {level}")
+    print(f"Потеря информации: {result['loss']:.3f}")
+    anon.print_result(*anon.format_k_anonymity(result["report"]))
+
+    if args.output:
+        table, stats = generalize_table(table, quasi_ids, result, args.max_suppression)
+        suppression.print_suppression(stats)
+        anon.export_output(
+            table, args.output, report=result["report"], quasi_ids=quasi_ids
+        )
+    return cli.EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
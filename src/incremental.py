@@ -0,0 +1,223 @@
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+
+import anonimization as anon
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deltas (
+    source TEXT NOT NULL,
+    quasi_key TEXT NOT NULL,
+    file TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    PRIMARY KEY (source, quasi_key)
+);
+CREATE TABLE IF NOT EXISTS totals (
+    quasi_key TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS group_counts (
+    quasi_key TEXT NOT NULL,
+    group_key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (quasi_key, group_key)
+);
+CREATE TABLE IF NOT EXISTS size_histogram (
+    quasi_key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    groups INTEGER NOT NULL,
+    PRIMARY KEY (quasi_key, size)
+);
+"""
+
+
+# ============================================
+# 🗄️ State file
+# ============================================
+
+
+def open_state(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def get_quasi_key(quasi_ids: list[str]) -> str:
+    return "|".join(quasi_ids)
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def group_keys(group_sizes: pd.Series) -> list[tuple]:
+    rows = []
+    for values, count in group_sizes.items():
+        if not isinstance(values, tuple):
+            values = (values,)
+        key = json.dumps([str(value) for value in values], ensure_ascii=False)
+        rows.append((key, int(count)))
+    return rows
+
+
+def shift_histogram(connection: sqlite3.Connection, quasi_key: str, sign: int):
+    # sizes of the groups touched by the delta, before or after the update
+    connection.execute(
+        """
+        INSERT INTO size_histogram (quasi_key, size, groups)
+        SELECT ?, g.count, ? * COUNT(*)
+        FROM delta d JOIN group_counts g
+            ON g.quasi_key = ? AND g.group_key = d.group_key
+        GROUP BY g.count
+        ON CONFLICT (quasi_key, size) DO UPDATE SET groups = groups + excluded.groups
+        """,
+        (quasi_key, sign, quasi_key),
+    )
+
+
+def add_group_sizes(
+    connection: sqlite3.Connection,
+    quasi_ids: list[str],
+    group_sizes: pd.Series,
+    rows: int,
+):
+    quasi_key = get_quasi_key(quasi_ids)
+    connection.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS delta (group_key TEXT PRIMARY KEY, count INTEGER)"
+    )
+    connection.execute("DELETE FROM delta")
+    connection.executemany("INSERT INTO delta VALUES (?, ?)", group_keys(group_sizes))
+
+    shift_histogram(connection, quasi_key, -1)
+    connection.execute(
+        """
+        INSERT INTO group_counts (quasi_key, group_key, count)
+        SELECT ?, group_key, count FROM delta WHERE true
+        ON CONFLICT (quasi_key, group_key) DO UPDATE SET count = count + excluded.count
+        """,
+        (quasi_key,),
+    )
+    shift_histogram(connection, quasi_key, 1)
+    connection.execute(
+        "DELETE FROM size_histogram WHERE quasi_key = ? AND groups = 0", (quasi_key,)
+    )
+
+    connection.execute(
+        """
+        INSERT INTO totals (quasi_key, rows) VALUES (?, ?)
+        ON CONFLICT (quasi_key) DO UPDATE SET rows = rows + excluded.rows
+        """,
+        # all rows, groupby leaves out rows with a missing quasi-identifier
+        (quasi_key, int(rows)),
+    )
+
+
+# ============================================
+# 📊 Cumulative report
+# ============================================
+
+
+def cumulative_report(connection: sqlite3.Connection, quasi_ids: list[str]) -> dict:
+    quasi_key = get_quasi_key(quasi_ids)
+    row = connection.execute(
+        "SELECT rows FROM totals WHERE quasi_key = ?", (quasi_key,)
+    ).fetchone()
+    if row is None:
+        raise KeyError(f"No state for quasi-identifiers: {quasi_key}")
+
+    histogram = dict(
+        connection.execute(
+            "SELECT size, groups FROM size_histogram WHERE quasi_key = ?",
+            (quasi_key,),
+        ).fetchall()
+    )
+    return anon.k_anonymity_from_histogram(pd.Series(histogram, dtype="int64"), row[0])
+
+
+# ============================================
+# ➕ Delta run
+# ============================================
+
+
+def pending_quasi_sets(
+    connection: sqlite3.Connection, source: str, quasi_sets: list[list[str]]
+) -> list[list[str]]:
+    # quasi sets that have not counted this delta yet, each one must have
+    # counted every earlier delta or its cumulative report would be partial
+    earlier = {
+        row[0]
+        for row in connection.execute(
+            "SELECT DISTINCT source FROM deltas WHERE source != ?", (source,)
+        )
+    }
+    pending = []
+    for quasi_ids in quasi_sets:
+        quasi_key = get_quasi_key(quasi_ids)
+        counted = {
+            row[0]
+            for row in connection.execute(
+                "SELECT source FROM deltas WHERE quasi_key = ?", (quasi_key,)
+            )
+        }
+        if source in counted:
+            continue
+        if counted != earlier:
+            raise ValueError(
+                f"State has no full history for quasi-identifiers {quasi_key}: "
+                f"{len(earlier - counted)} earlier deltas were not counted for them"
+            )
+        pending.append(quasi_ids)
+    return pending
+
+
+def run_delta(
+    state_path: str,
+    in_path: str,
+    out_path: str | None,
+    quasi_sets: list[list[str]],
+    file_format: str | None = None,
+    output_format: str | None = None,
+) -> dict:
+    source = file_hash(in_path)
+    connection = open_state(state_path)
+    try:
+        pending = pending_quasi_sets(connection, source, quasi_sets)
+        if pending or out_path:
+            table = anon.Load_table(in_path, file_format=file_format)
+            table = anon.table_validate(table)
+            table = anon.full_anonymization(table)
+            if out_path:
+                anon.export_output(table, out_path, output_format)
+
+            # counts and the delta records commit together or not at all
+            with connection:
+                for quasi_ids in pending:
+                    add_group_sizes(
+                        connection,
+                        quasi_ids,
+                        anon.get_group_sizes(table, quasi_ids),
+                        len(table),
+                    )
+                    connection.execute(
+                        "INSERT INTO deltas VALUES (?, ?, ?, ?)",
+                        (
+                            source,
+                            get_quasi_key(quasi_ids),
+                            str(Path(in_path)),
+                            len(table),
+                        ),
+                    )
+
+        return {
+            get_quasi_key(quasi_ids): cumulative_report(connection, quasi_ids)
+            for quasi_ids in quasi_sets
+        }
+    finally:
+        connection.close()
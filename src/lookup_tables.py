@@ -0,0 +1,170 @@
+import contextlib
+import contextvars
+import hashlib
+import os
+import pickle
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import dictionaries as dicts
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / ".cache"
+MAPPINGS = ("anonymized_stores", "districts", "categories", "brands")
+
+# label for values missing from a dictionary, None aborts with KeyError
+fallback = "unknown"
+
+# mapping name -> Counter of values that were not found
+unknown_values = {}
+
+# a job that collects its own unknowns, e.g. one request of the service
+collected_unknowns = contextvars.ContextVar("collected_unknowns", default=None)
+
+
+# ============================================
+# 🗜️ Compilation and disk cache
+# ============================================
+
+
+def dictionaries_hash() -> str:
+    return hashlib.sha256(Path(dicts.__file__).read_bytes()).hexdigest()
+
+
+def compile_mapping(mapping: dict) -> dict:
+    keys = pd.Index(list(mapping.keys()))
+    codes, categories = pd.factorize(pd.Series(list(mapping.values())))
+    return {
+        "keys": keys,
+        "codes": codes.astype(np.int32),
+        "categories": list(categories),
+    }
+
+
+def build_tables() -> dict:
+    return {name: compile_mapping(getattr(dicts, name)) for name in MAPPINGS}
+
+
+def load_tables(cache_dir: Path = CACHE_DIR) -> dict:
+    path = cache_dir / "lookup_tables.pkl"
+    content_hash = dictionaries_hash()
+
+    if path.exists():
+        try:
+            with open(path, "rb") as file:
+                cached = pickle.load(file)
+            if cached["hash"] == content_hash:
+                return cached["tables"]
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+            pass
+
+    tables = build_tables()
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary, "wb") as file:
+            pickle.dump({"hash": content_hash, "tables": tables}, file)
+        os.replace(temporary, path)
+    except OSError:
+        pass
+    return tables
+
+
+tables = None
+
+
+def get_table(name: str) -> dict:
+    global tables
+    if tables is None:
+        tables = load_tables()
+    return tables[name]
+
+
+# ============================================
+# 🔎 Vectorized lookups
+# ============================================
+
+
+def map_column(column: pd.Series, name: str) -> pd.Series:
+    table = get_table(name)
+
+    # look up each distinct value once, then take by codes
+    codes, uniques = pd.factorize(column)
+    positions = table["keys"].get_indexer(uniques)
+    unique_codes = np.where(positions >= 0, table["codes"][positions], -1)
+
+    categories = table["categories"]
+    missing = positions < 0
+    if missing.any():
+        found = uniques[missing]
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))[missing]
+        record_unknowns(name, dict(zip(found, counts)))
+        if fallback is None:
+            raise KeyError(found[0])
+        if fallback not in categories:
+            categories = categories + [fallback]
+        unique_codes[missing] = categories.index(fallback)
+
+    mapped = np.where(codes >= 0, unique_codes[codes], -1)
+    generalized = pd.Categorical.from_codes(mapped, categories=categories)
+    return pd.Series(generalized, index=column.index, name=column.name)
+
+
+def map_value(value, name: str):
+    # per-value twin of map_column, for the reference engine
+    if pd.isna(value):
+        return value
+    mapping = getattr(dicts, name)
+    if value in mapping:
+        return mapping[value]
+    return unknown_value(name, value)
+
+
+def unknown_value(name: str, value):
+    record_unknowns(name, {value: 1})
+    if fallback is None:
+        raise KeyError(value)
+    return fallback
+
+
+def get_unknowns_report() -> pd.DataFrame:
+    rows = [
+        {"dictionary": name, "value": value, "rows": int(count)}
+        for name, counter in unknown_values.items()
+        for value, count in counter.most_common()
+    ]
+    return pd.DataFrame(rows, columns=["dictionary", "value", "rows"])
+
+
+def reset_unknowns():
+    unknown_values.clear()
+
+
+def record_unknowns(name: str, counts: dict):
+    unknowns = collected_unknowns.get()
+    if unknowns is None:
+        unknowns = unknown_values
+    unknowns.setdefault(name, Counter()).update(counts)
+
+
+@contextlib.contextmanager
+def collect_unknowns():
+    # unknowns of the current thread or task go here, not to unknown_values
+    unknowns = {}
+    token = collected_unknowns.set(unknowns)
+    try:
+        yield unknowns
+    finally:
+        collected_unknowns.reset(token)
+
+
+def unknowns_snapshot(unknowns: dict | None = None) -> dict:
+    # JSON-ready copy, of unknown_values unless a collection is given
+    if unknowns is None:
+        unknowns = unknown_values
+    return {
+        name: {str(value): int(count) for value, count in counter.items()}
+        for name, counter in unknowns.items()
+    }
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+import anonimization as anon
+import binning
+
+# ============================================
+# 🧮 Sensitive value codes
+# ============================================
+
+
+def sensitive_codes(column: pd.Series, bins: int = 10) -> tuple:
+    # codes, number of values and whether the values are ordered
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        ordered = column.cat.ordered or column.name in binning.bins
+        return column.cat.codes.to_numpy(), len(column.cat.categories), ordered
+    if pd.api.types.is_numeric_dtype(column):
+        binned = pd.qcut(column, q=bins, duplicates="drop")
+        return binned.cat.codes.to_numpy(), len(binned.cat.categories), True
+    codes, uniques = pd.factorize(column)
+    return codes, len(uniques), False
+
+
+def pair_counts(ids: np.ndarray, codes: np.ndarray, values: int) -> tuple:
+    # sparse contingency table: one entry per (class, value) that occurs
+    valid = (ids >= 0) & (codes >= 0)
+    pairs = ids[valid].astype(np.int64) * values + codes[valid]
+    pairs, counts = np.unique(pairs, return_counts=True)
+    return pairs // values, pairs % values, counts
+
+
+# ============================================
+# 📐 Distances
+# ============================================
+
+
+def unordered_distance(groups, values, counts, group_rows, overall) -> np.ndarray:
+    # EMD with equal ground distance is the total variation distance
+    share = counts / group_rows[groups]
+    present = np.bincount(
+        groups, weights=np.abs(share - overall[values]), minlength=len(group_rows)
+    )
+    covered = np.bincount(groups, weights=overall[values], minlength=len(group_rows))
+    return 0.5 * (present + 1 - covered)
+
+
+def ordered_distance(
+    groups, values, counts, group_rows, overall, block: int = 65536
+) -> np.ndarray:
+    # EMD over ordered bins: mean absolute difference of the cumulative shares
+    value_count = len(overall)
+    overall_cumulative = np.cumsum(overall)
+    distance = np.zeros(len(group_rows))
+    if value_count < 2:
+        return distance
+
+    for start in range(0, len(group_rows), block):
+        stop = min(start + block, len(group_rows))
+        selected = (groups >= start) & (groups < stop)
+        dense = np.zeros((stop - start, value_count))
+        np.add.at(dense, (groups[selected] - start, values[selected]), counts[selected])
+        dense /= np.maximum(group_rows[start:stop, None], 1)
+        difference = np.cumsum(dense, axis=1) - overall_cumulative
+        distance[start:stop] = np.abs(difference).sum(axis=1) / (value_count - 1)
+    return distance
+
+
+# ============================================
+# 📊 Report
+# ============================================
+
+
+def sensitive_report(
+    ids: np.ndarray, column: pd.Series, sizes: np.ndarray, l: int, t: float
+) -> dict:
+    codes, value_count, ordered = sensitive_codes(column)
+    groups, values, counts = pair_counts(ids, codes, value_count)
+    group_rows = np.bincount(groups, weights=counts, minlength=len(sizes))
+
+    distinct = np.bincount(groups, minlength=len(sizes))
+    share = counts / group_rows[groups]
+    entropy = np.bincount(groups, weights=-share * np.log(share), minlength=len(sizes))
+
+    overall = np.bincount(values, weights=counts, minlength=value_count)
+    overall = overall / max(overall.sum(), 1)
+    if ordered:
+        distance = ordered_distance(groups, values, counts, group_rows, overall)
+    else:
+        distance = unordered_distance(groups, values, counts, group_rows, overall)
+
+    total = sizes.sum()
+    observed = group_rows > 0
+    return {
+        "ordered": bool(ordered),
+        "l": l,
+        "l_distinct_min": int(distinct[observed].min()) if observed.any() else 0,
+        "l_entropy_min": (
+            float(np.exp(entropy[observed].min())) if observed.any() else 0.0
+        ),
+        "fraction_l_diverse": float(sizes[distinct >= l].sum() / total * 100),
+        "fraction_entropy_l_diverse": float(
+            sizes[np.exp(entropy) >= l].sum() / total * 100
+        ),
+        "t": t,
+        "t_max": float(distance[observed].max()) if observed.any() else 0.0,
+        "fraction_t_close": float(sizes[distance <= t].sum() / total * 100),
+    }
+
+
+def privacy_report(
+    table: pd.DataFrame,
+    quasi_ids: list[str],
+    sensitive: list[str],
+    l: int = 2,
+    t: float = 0.2,
+    k: int | None = None,
+) -> dict:
+    # one grouping serves k, l and t
+    grouped = table.groupby(quasi_ids, observed=True, sort=False)
+    ids = grouped.ngroup().to_numpy()
+    sizes = np.bincount(ids[ids >= 0])
+
+    report = anon.k_anonymity_from_group_sizes(pd.Series(sizes), len(table), k)
+    report["sensitive"] = {
+        column: sensitive_report(ids, table[column], sizes, l, t)
+        for column in sensitive
+    }
+    return report
+
+
+def print_privacy(report: dict):
+    for column, metrics in report["sensitive"].items():
+        print(f"Чувствительный атрибут: {column}")
+        print(
+            f"  l-разнообразие (различных значений) >= {metrics['l']}: "
+            f"{metrics['fraction_l_diverse']:.2f}% строк, минимум {metrics['l_distinct_min']}"
+        )
+        print(
+            f"  энтропийное l-разнообразие >= {metrics['l']}: "
+            f"{metrics['fraction_entropy_l_diverse']:.2f}% строк, "
+            f"минимум {metrics['l_entropy_min']:.2f}"
+        )
+        print(
+            f"  t-близость <= {metrics['t']}: {metrics['fraction_t_close']:.2f}% строк, "
+            f"максимум {metrics['t_max']:.3f}"
+        )
@@ -0,0 +1,143 @@
+import contextlib
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+
+# stage() is a shared no-op context until enable() is called
+enabled = False
+trace_memory = False
+profiler = None
+records = []
+
+NULL_STAGE = contextlib.nullcontext({})
+
+
+# ============================================
+# 🎛️ Switches
+# ============================================
+
+
+def enable(memory: bool = False, cprofile: bool = False):
+    global enabled, trace_memory, profiler
+    enabled = True
+    trace_memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if cprofile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+
+def disable():
+    global enabled, trace_memory, profiler
+    enabled = False
+    if trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    trace_memory = False
+    if profiler is not None:
+        profiler.disable()
+
+
+def reset():
+    records.clear()
+
+
+def max_rss() -> int | None:
+    # resource is Unix only, Windows runs go without peak memory
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+# ============================================
+# ⏱️ Stages
+# ============================================
+
+
+@contextlib.contextmanager
+def measured_stage(name: str, rows: int | None):
+    record = {"stage": name, "rows": rows}
+    if trace_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        seconds = time.perf_counter() - start
+        record["seconds"] = seconds
+        if record["rows"] is not None and seconds > 0:
+            record["rows_per_second"] = record["rows"] / seconds
+        if trace_memory:
+            record["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        record["max_rss_bytes"] = max_rss()
+        records.append(record)
+
+
+def stage(name: str, rows: int | None = None):
+    # the yielded record takes rows once they are known, e.g. after loading
+    if not enabled:
+        return NULL_STAGE
+    return measured_stage(name, rows)
+
+
+# ============================================
+# 📤 Output
+# ============================================
+
+
+def write_json_lines(file):
+    for record in records:
+        file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def prometheus_text() -> str:
+    totals = {}
+    for record in records:
+        total = totals.setdefault(
+            record["stage"], {"seconds": 0.0, "rows": 0, "calls": 0, "peak": 0}
+        )
+        total["seconds"] += record["seconds"]
+        total["rows"] += record["rows"] or 0
+        total["calls"] += 1
+        total["peak"] = max(total["peak"], record.get("peak_bytes", 0))
+
+    metrics = [
+        ("seconds_total", "counter", "Wall time spent in the stage", "seconds"),
+        ("rows_total", "counter", "Rows processed by the stage", "rows"),
+        ("calls_total", "counter", "Times the stage ran", "calls"),
+        ("peak_bytes", "gauge", "Traced memory high-water mark", "peak"),
+    ]
+    lines = []
+    for suffix, kind, description, key in metrics:
+        name = f"anonimization_stage_{suffix}"
+        lines.append(f"# HELP {name} {description}.")
+        lines.append(f"# TYPE {name} {kind}")
+        for stage_name, total in totals.items():
+            label = stage_name.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{name}{{stage="{label}"}} {total[key]}')
+
+    rss = max_rss()
+    if rss is not None:
+        lines.append("# HELP anonimization_max_rss_bytes Peak resident memory.")
+        lines.append("# TYPE anonimization_max_rss_bytes gauge")
+        lines.append(f"anonimization_max_rss_bytes {rss}")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(path: str):
+    with open(path, "w", encoding="utf-8") as file:
+        if str(path).endswith(".prom"):
+            file.write(prometheus_text())
+        else:
+            write_json_lines(file)
+
+
+def dump_profile(path: str):
+    if profiler is not None:
+        profiler.dump_stats(path)
@@ -0,0 +1,196 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+import anonimization as anon
+
+# ============================================
+# 🔢 Column factorization
+# ============================================
+
+
+def factorize_columns(table: pd.DataFrame, columns: list[str]) -> tuple:
+    # integer codes per column, -1 marks missing values
+    codes = np.empty((len(table), len(columns)), dtype=np.int32)
+    cardinalities = []
+    for index, column in enumerate(columns):
+        column_codes, uniques = pd.factorize(table[column])
+        codes[:, index] = column_codes
+        cardinalities.append(len(uniques))
+    return codes, np.array(cardinalities, dtype=np.int64)
+
+
+# products of cardinalities up to this size are used as ids directly
+DENSE_IDS = 1 << 22
+
+
+def combine_codes(
+    parent: np.ndarray, codes: np.ndarray, cardinality: int
+) -> np.ndarray:
+    combined = parent.astype(np.int64) * cardinality + codes
+    valid = (parent >= 0) & (codes >= 0)
+    if (int(parent.max(initial=-1)) + 1) * cardinality <= DENSE_IDS:
+        return np.where(valid, combined, -1)
+
+    # compact ids so that products of cardinalities never overflow
+    ids = np.full(len(parent), -1, dtype=np.int64)
+    ids[valid] = pd.factorize(combined[valid])[0]
+    return ids
+
+
+def summarize_ids(ids: np.ndarray, total: int) -> dict:
+    # dense ids leave gaps, empty ids are not groups
+    group_sizes = np.bincount(ids[ids >= 0])
+    group_sizes = pd.Series(group_sizes[group_sizes > 0])
+    return anon.k_anonymity_from_group_sizes(group_sizes, total)
+
+
+# ============================================
+# 🌳 Combination tree
+# ============================================
+
+
+shared_codes = None
+shared_cardinalities = None
+
+
+def init_worker(codes: np.ndarray, cardinalities: np.ndarray):
+    global shared_codes, shared_cardinalities
+    shared_codes = codes
+    shared_cardinalities = cardinalities
+
+
+def evaluate_subtree(prefix: tuple) -> list:
+    # every combination whose lowest column indices are exactly prefix,
+    # each one extends its parent's group ids by a single column
+    codes, cardinalities = shared_codes, shared_cardinalities
+    total = len(codes)
+
+    ids = codes[:, prefix[0]].astype(np.int64)
+    for index in prefix[1:]:
+        ids = combine_codes(ids, codes[:, index], cardinalities[index])
+
+    results = [(prefix, summarize_ids(ids, total))]
+    stack = [(prefix, ids)]
+    while stack:
+        combination, parent = stack.pop()
+        for index in range(combination[-1] + 1, codes.shape[1]):
+            child = combination + (index,)
+            child_ids = combine_codes(parent, codes[:, index], cardinalities[index])
+            results.append((child, summarize_ids(child_ids, total)))
+            stack.append((child, child_ids))
+    return results
+
+
+def evaluate_single(index: int) -> tuple:
+    codes = shared_codes[:, index].astype(np.int64)
+    return ((index,), summarize_ids(codes, len(shared_codes)))
+
+
+# ============================================
+# 📊 Ranking
+# ============================================
+
+
+def rank_quasi_combinations(
+    table: pd.DataFrame,
+    columns: list[str] | None = None,
+    workers: int | None = None,
+) -> pd.DataFrame:
+    if columns is None:
+        columns = anon.get_quasis("1 2 3 4 5 6 7 8 9")
+    codes, cardinalities = factorize_columns(table, columns)
+
+    # pairs root the subtrees of every larger combination
+    singles = list(range(len(columns)))
+    roots = list(combinations(singles, 2))
+
+    results = []
+    if workers == 1:
+        init_worker(codes, cardinalities)
+        for index in singles:
+            results.append(evaluate_single(index))
+        for root in roots:
+            results.extend(evaluate_subtree(root))
+    else:
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(codes, cardinalities),
+        ) as executor:
+            results.extend(executor.map(evaluate_single, singles))
+            for subtree in executor.map(evaluate_subtree, roots):
+                results.extend(subtree)
+
+    rows = []
+    for combination, report in results:
+        bad_k = dict(report["bad_k"])
+        rows.append(
+            {
+                "quasi_ids": ", ".join(columns[index] for index in combination),
+                "columns": len(combination),
+                "k": report["k"],
+                "groups": report["groups"],
+                "fraction_good": report["fraction_good"],
+                "fraction_unique": bad_k.get(1, 0.0),
+            }
+        )
+
+    ranking = pd.DataFrame(rows).sort_values(
+        ["fraction_good", "fraction_unique", "columns"],
+        ascending=[True, False, True],
+        ignore_index=True,
+    )
+    ranking.insert(0, "risk_rank", range(1, len(ranking) + 1))
+    return ranking
+
+
+# ============================================
+# ▶️ Main
+# ============================================
+
+
+def main(argv: list[str] | None = None) -> int:
+    # cli imports session, which imports this module
+    import cli
+
+    parser = argparse.ArgumentParser(
+        prog="quasi_search",
+        description="Rank every quasi-identifier combination by re-identification risk.",
+    )
+    parser.add_argument("input", help="input table")
+    parser.add_argument("--format", help="input format, by extension if omitted")
+    parser.add_argument("--cards", choices=["mask", "pseudonymize"], default="mask")
+    parser.add_argument(
+        "-q", "--quasi-ids", help="columns to combine, all nine if omitted"
+    )
+    parser.add_argument("-j", "--workers", type=int, help="process limit")
+    parser.add_argument("--top", type=int, default=20, help="rows to print")
+    parser.add_argument("-o", "--output", help="save the full ranking")
+    args = parser.parse_args(argv)
+
+    try:
+        anon.set_card_mode(args.cards)
+        columns = cli.parse_quasi_ids(args.quasi_ids) if args.quasi_ids else None
+        table = anon.Load_table(args.input, anon.get_projection(columns), args.format)
+    except (OSError, ValueError) as error:
+        print(f"quasi_search: {error}", file=sys.stderr)
+        return cli.EXIT_USAGE
+
+    # ranked on the anonymized table, as the report of a run sees it
+    table = anon.full_anonymization(anon.table_validate(table))
+    ranking = rank_quasi_combinations(table, columns, args.workers)
+    print(ranking.head(args.top).to_string(index=False))
+    if args.output:
+        anon.export_output(ranking, args.output)
+    return cli.EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
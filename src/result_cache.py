@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import Counter
+from pathlib import Path
+
+import anonimization as anon
+import binning
+import incremental
+import lookup_tables
+import spatial
+
+RESULTS_DIR = lookup_tables.CACHE_DIR / "results"
+MAX_CACHE_BYTES = 2 << 30
+
+# options that change the output or the report, the rest only change speed
+RESULT_OPTIONS = (
+    "format",
+    "output_format",
+    "quasi_ids",
+    "mode",
+    "sensitive",
+    "l",
+    "t",
+    "risk",
+    "sampling_fraction",
+    "suppress",
+    "max_suppression",
+    # a run never replays the report of another backend
+    "backend",
+)
+
+
+# ============================================
+# 🔑 Cache keys
+# ============================================
+
+
+def methods_config() -> dict:
+    config = {
+        "methods": {
+            column: f"{method.__module__}.{method.__qualname__}"
+            for column, method in anon.vectorized_methods.items()
+        },
+        "bins": binning.bins,
+        "fallback": lookup_tables.fallback,
+        "dictionaries": lookup_tables.dictionaries_hash(),
+    }
+    if spatial.DISTRICTS_PATH.exists():
+        config["districts"] = incremental.file_hash(spatial.DISTRICTS_PATH)
+    if anon.vectorized_methods["cards_number"] is anon.pseudonymize_card_numbers:
+        # tokens change with the key, only its digest goes into the cache key
+        config["card_key"] = hashlib.sha256(anon.get_card_key()).hexdigest()
+    return config
+
+
+def result_key(options: dict) -> str:
+    content = {
+        "input": incremental.file_hash(options["input"]),
+        "output_suffix": Path(options["output"] or "").suffix.lower(),
+        "options": {name: options[name] for name in RESULT_OPTIONS},
+        "config": methods_config(),
+    }
+    encoded = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+# ============================================
+# 🗄️ Entries
+# ============================================
+
+
+def entry_size(entry: Path) -> int:
+    return sum(path.stat().st_size for path in entry.iterdir())
+
+
+def load(key: str, output: str | None, results_dir: Path = RESULTS_DIR):
+    entry = results_dir / key
+    try:
+        with open(entry / "result.json", encoding="utf-8") as file:
+            result = json.load(file)
+        if output:
+            # a copy, not a link: a later export would truncate the entry
+            shutil.copyfile(entry / "output", output)
+    except (OSError, ValueError):
+        return None
+    # access time for LRU, many file systems mount with noatime
+    os.utime(entry)
+
+    for name, values in result["unknowns"].items():
+        lookup_tables.unknown_values.setdefault(name, Counter()).update(values)
+    return result
+
+
+def store(
+    key: str,
+    output: str | None,
+    report: dict | None,
+    unknowns: dict,
+    results_dir: Path = RESULTS_DIR,
+    max_bytes: int = MAX_CACHE_BYTES,
+):
+    entry = results_dir / key
+    temporary = results_dir / f"{key}.{os.getpid()}.tmp"
+    result = {"report": report, "unknowns": unknowns, "created": time.time()}
+    try:
+        temporary.mkdir(parents=True, exist_ok=True)
+        if output:
+            shutil.copyfile(output, temporary / "output")
+        with open(temporary / "result.json", "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(temporary, entry)
+    except OSError:
+        shutil.rmtree(temporary, ignore_errors=True)
+        return
+    evict(results_dir, max_bytes)
+
+
+def evict(results_dir: Path = RESULTS_DIR, max_bytes: int = MAX_CACHE_BYTES):
+    entries = [
+        entry
+        for entry in results_dir.iterdir()
+        if entry.is_dir() and entry.suffix != ".tmp"
+    ]
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    sizes = {entry: entry_size(entry) for entry in entries}
+    total = sum(sizes.values())
+
+    # least recently used first, the newest entry stays even if oversized
+    for entry in entries[:-1]:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= sizes[entry]
+
+
+def cached_run(run, options: dict, max_bytes: int = MAX_CACHE_BYTES) -> dict | None:
+    output = options["output"] if options["mode"] in ("anonymize", "both") else None
+    key = result_key(options)
+
+    result = load(key, output)
+    if result is not None:
+        return result["report"]
+
+    lookup_tables.reset_unknowns()
+    report = run(options)
+    store(key, output, report, lookup_tables.unknowns_snapshot(), max_bytes=max_bytes)
+    return report
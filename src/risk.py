@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+
+import anonimization as anon
+
+# ============================================
+# 🎯 Exact risk
+# ============================================
+
+
+def risk_from_sizes(sizes: np.ndarray, sampling_fraction: float, k: int) -> dict:
+    # sizes: equivalence class size of every record (or of sampled records)
+    total = len(sizes)
+    population = np.maximum(sizes / sampling_fraction, sizes)
+    return {
+        "records": total,
+        "k": k,
+        "prosecutor_max": float((1 / sizes).max()) if total else 0.0,
+        "prosecutor_avg": float((1 / sizes).mean()) if total else 0.0,
+        "journalist_max": float((1 / population).max()) if total else 0.0,
+        "journalist_avg": float((1 / population).mean()) if total else 0.0,
+        # expected share of records matched by linking against the population
+        "marketer": float((sizes / population / sizes).sum() / total) if total else 0.0,
+        "unique_records": float((sizes == 1).mean() * 100) if total else 0.0,
+        "records_at_risk": float((sizes < k).mean() * 100) if total else 0.0,
+    }
+
+
+def exact_risk(
+    table: pd.DataFrame,
+    quasi_ids: list[str],
+    sampling_fraction: float = 1.0,
+    k: int | None = None,
+) -> tuple:
+    ids = table.groupby(quasi_ids, observed=True, sort=False).ngroup().to_numpy()
+    sizes = np.bincount(ids[ids >= 0])[ids[ids >= 0]]
+
+    records = pd.DataFrame(index=table.index[ids >= 0])
+    records["class_size"] = sizes
+    records["prosecutor"] = 1 / sizes
+    records["journalist"] = 1 / np.maximum(sizes / sampling_fraction, sizes)
+    k = k or anon.get_good_k_for_rows(len(table))
+    return records, risk_from_sizes(sizes, sampling_fraction, k)
+
+
+# ============================================
+# 🧮 HyperLogLog
+# ============================================
+
+
+def row_hashes(table: pd.DataFrame, quasi_ids: list[str]) -> np.ndarray:
+    # hashes the values, not the codes, so chunks with other categories agree
+    return pd.util.hash_pandas_object(table[quasi_ids], index=False).to_numpy()
+
+
+def bit_length(values: np.ndarray) -> np.ndarray:
+    # frexp is exact below 2**53, so split the 64 bits into halves
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray):
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        rank = (bits - bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def relative_error(self) -> float:
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if raw <= 2.5 * m and zeros:
+            return float(m * np.log(m / zeros))
+        return float(raw)
+
+
+# ============================================
+# 🎲 Sampled risk
+# ============================================
+
+
+class RiskSketch:
+    # pass one: distinct classes and a reservoir of records,
+    # pass two: exact class sizes for the sampled records only
+    def __init__(self, sample_size: int = 10000, precision: int = 14, seed: int = 0):
+        self.hll = HyperLogLog(precision)
+        self.rng = np.random.default_rng(seed)
+        self.sample_size = sample_size
+        self.sample = np.empty(0, dtype=np.uint64)
+        self.records = 0
+        self.sample_keys = None
+        self.sample_counts = None
+
+    def update(self, hashes: np.ndarray):
+        self.hll.update(hashes)
+
+        free = self.sample_size - len(self.sample)
+        if free > 0:
+            self.sample = np.concatenate([self.sample, hashes[:free]])
+        rest = hashes[max(free, 0) :]
+        if len(rest):
+            # algorithm R: record i replaces a random slot with p = size / i
+            seen = self.records + max(free, 0) + np.arange(1, len(rest) + 1)
+            slots = (self.rng.random(len(rest)) * seen).astype(np.int64)
+            kept = slots < self.sample_size
+            self.sample[slots[kept]] = rest[kept]
+        self.records += len(hashes)
+
+    def count(self, hashes: np.ndarray):
+        if self.sample_keys is None:
+            self.sample_keys = np.unique(self.sample)
+            self.sample_counts = np.zeros(len(self.sample_keys), dtype=np.int64)
+        positions = np.searchsorted(self.sample_keys, hashes)
+        positions = np.minimum(positions, len(self.sample_keys) - 1)
+        matched = positions[self.sample_keys[positions] == hashes]
+        self.sample_counts += np.bincount(matched, minlength=len(self.sample_keys))
+
+    def report(
+        self, sampling_fraction: float = 1.0, k: int | None = None, z: float = 1.96
+    ) -> dict:
+        positions = np.searchsorted(self.sample_keys, self.sample)
+        sizes = self.sample_counts[positions]
+        k = k or anon.get_good_k_for_rows(self.records)
+        report = risk_from_sizes(sizes, sampling_fraction, k)
+        report["records"] = self.records
+        report["sampled_records"] = len(sizes)
+
+        # normal confidence half-widths for the sampled means
+        n = len(sizes)
+        prosecutor = 1 / sizes
+        report["prosecutor_avg_error"] = float(z * prosecutor.std(ddof=1) / np.sqrt(n))
+        for key in ("unique_records", "records_at_risk"):
+            share = report[key] / 100
+            report[f"{key}_error"] = float(z * np.sqrt(share * (1 - share) / n) * 100)
+
+        # prosecutor_max is only a lower bound from a sample
+        report["prosecutor_max_is_lower_bound"] = True
+        groups = self.hll.estimate()
+        report["groups_estimate"] = groups
+        report["groups_relative_error"] = float(self.hll.relative_error())
+        report["prosecutor_avg_from_groups"] = groups / self.records
+        return report
+
+
+def approximate_risk(
+    table: pd.DataFrame,
+    quasi_ids: list[str],
+    sample_size: int = 10000,
+    sampling_fraction: float = 1.0,
+    seed: int = 0,
+    k: int | None = None,
+) -> dict:
+    hashes = row_hashes(table, quasi_ids)
+    sketch = RiskSketch(sample_size, seed=seed)
+    sketch.update(hashes)
+    sketch.count(hashes)
+    return sketch.report(sampling_fraction, k)
+
+
+def approximate_risk_chunks(
+    read_chunks,
+    quasi_ids: list[str],
+    sample_size: int = 10000,
+    sampling_fraction: float = 1.0,
+    seed: int = 0,
+    k: int | None = None,
+) -> dict:
+    # read_chunks() is called twice and must yield the same anonymized chunks
+    sketch = RiskSketch(sample_size, seed=seed)
+    for chunk in read_chunks():
+        sketch.update(row_hashes(chunk, quasi_ids))
+    for chunk in read_chunks():
+        sketch.count(row_hashes(chunk, quasi_ids))
+    return sketch.report(sampling_fraction, k)
+
+
+def print_risk(report: dict):
+    print("Риск повторной идентификации:")
+    print(
+        f"  прокурор: максимум {report['prosecutor_max']:.4f}, "
+        f"в среднем {report['prosecutor_avg']:.4f}"
+    )
+    print(
+        f"  журналист: максимум {report['journalist_max']:.4f}, "
+        f"в среднем {report['journalist_avg']:.4f}"
+    )
+    print(f"  маркетолог: {report['marketer']:.4f}")
+    print(f"  уникальных записей: {report['unique_records']:.2f}%")
+    if "sampled_records" in report:
+        print(
+            f"  оценка по выборке из {report['sampled_records']} записей, "
+            f"классов примерно {report['groups_estimate']:.0f}"
+        )
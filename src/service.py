@@ -0,0 +1,438 @@
+import argparse
+import asyncio
+import http.client
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import pandas as pd
+
+import anonimization as anon
+import cli
+import lookup_tables
+import spatial
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY = 512 << 20
+BATCH_ROWS = 65536
+BLOCK_SIZE = 1 << 20
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+suffixes = {
+    "excel": ".xlsx",
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+content_types = {
+    "excel": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "feather": "application/vnd.apache.arrow.file",
+    "arrow": ARROW_STREAM,
+}
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ============================================
+# 🔥 Warm state
+# ============================================
+
+
+def warm_up():
+    # what every cold run pays for: imports, lookup tables, spatial index
+    import openpyxl  # noqa: F401
+    import pyarrow.parquet  # noqa: F401
+
+    for name in lookup_tables.MAPPINGS:
+        lookup_tables.get_table(name)
+    spatial.get_index()
+
+
+# ============================================
+# ⚙️ Jobs
+# ============================================
+
+
+def read_body(body: bytes, file_format: str) -> pd.DataFrame:
+    if file_format == "arrow":
+        import pyarrow as pa
+
+        table = pa.ipc.open_stream(body).read_pandas()
+        return table.astype(anon.get_dtypes(list(table.columns)))
+
+    if file_format not in suffixes:
+        raise ValueError(f"Unknown table format: {file_format}")
+    # the loaders take paths, an Excel workbook needs a seekable file anyway
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / f"input{suffixes[file_format]}"
+        path.write_bytes(body)
+        return anon.Load_table(path, file_format=file_format)
+
+
+def encode_arrow(table: pd.DataFrame):
+    import pyarrow as pa
+
+    batches = pa.Table.from_pandas(table, preserve_index=False).to_batches(BATCH_ROWS)
+    sink = io.BytesIO()
+    writer = None
+    for batch in batches:
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, batch.schema)
+        writer.write_batch(batch)
+        yield take_buffer(sink)
+    if writer is not None:
+        writer.close()
+        yield take_buffer(sink)
+
+
+def take_buffer(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def encode_output(table: pd.DataFrame, file_format: str):
+    if file_format == "arrow":
+        yield from encode_arrow(table)
+        return
+
+    if file_format not in suffixes:
+        raise ValueError(f"Unknown table format: {file_format}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / f"output{suffixes[file_format]}"
+        anon.export_output(table, path, file_format)
+        with open(path, "rb") as file:
+            yield from iter(lambda: file.read(BLOCK_SIZE), b"")
+
+
+def run_job(
+    body: bytes,
+    file_format: str,
+    quasi_ids: list[str] | None,
+    output_format: str | None,
+):
+    # each job counts its own unmapped values, the process-wide counter
+    # would grow forever and mix concurrent jobs
+    with lookup_tables.collect_unknowns() as unknowns:
+        table = read_body(body, file_format)
+        if not output_format:
+            table = table[anon.get_projection(quasi_ids)]
+        table = anon.table_validate(table)
+        table = anon.full_anonymization(table)
+    unknowns = lookup_tables.unknowns_snapshot(unknowns)
+
+    report = anon.k_anonymity_report(table, quasi_ids) if quasi_ids else None
+    if not output_format:
+        return None, report, unknowns
+    # encoded lazily, chunk by chunk, while the response is sent
+    return encode_output(table, output_format), report, unknowns
+
+
+# ============================================
+# 🌐 HTTP
+# ============================================
+
+
+class Service:
+    def __init__(self, workers: int | None = None, queue: int | None = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        # running plus waiting jobs, more are turned away with 503
+        self.max_pending = self.workers + (queue if queue is not None else self.workers)
+        self.pending = 0
+        self.served = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                keep_alive = await self.respond(writer, *request)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(
+        self, writer: asyncio.StreamWriter, method: str, target: str, headers, body
+    ) -> bool:
+        keep_alive = headers.get("connection", "").lower() != "close"
+        try:
+            match method, urlsplit(target).path:
+                case "GET", "/health":
+                    send_json(writer, 200, self.health(), keep_alive)
+                case "POST", "/report":
+                    *_, report, unknowns = await self.submit(
+                        headers, target, body, False
+                    )
+                    send_json(writer, 200, {**report, "unknowns": unknowns}, keep_alive)
+                case "POST", "/anonymize":
+                    await self.stream(writer, headers, target, body, keep_alive)
+                case _:
+                    raise RequestError(404, f"No route for {method} {target}")
+        except RequestError as error:
+            send_json(writer, error.status, {"error": str(error)}, keep_alive)
+        except (ValueError, KeyError, OSError) as error:
+            message = f"{type(error).__name__}: {error}"
+            send_json(writer, 400, {"error": message}, keep_alive)
+        return keep_alive
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "workers": self.workers,
+            "pending": self.pending,
+            "served": self.served,
+        }
+
+    async def run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def submit(self, headers, target: str, body: bytes, export: bool):
+        file_format, quasi_ids, output_format = parse_query(headers, target)
+        if export:
+            output_format = output_format or file_format
+        elif not quasi_ids:
+            raise RequestError(400, "Report needs quasi_ids")
+        else:
+            output_format = None
+
+        if self.pending >= self.max_pending:
+            raise RequestError(503, "All workers are busy")
+        self.pending += 1
+        try:
+            chunks, report, unknowns = await self.run(
+                run_job, body, file_format, quasi_ids, output_format
+            )
+        finally:
+            self.pending -= 1
+            self.served += 1
+        return output_format, chunks, report, unknowns
+
+    async def stream(self, writer, headers, target: str, body: bytes, keep_alive):
+        output_format, chunks, report, unknowns = await self.submit(
+            headers, target, body, True
+        )
+        # the first chunk is encoded before the head, so errors still get a status
+        chunk = await self.run(next, chunks, b"")
+
+        headers = {
+            "Content-Type": content_types[output_format],
+            "Transfer-Encoding": "chunked",
+        }
+        # ASCII-only JSON keeps the headers latin-1 safe
+        if report is not None:
+            headers["X-K-Anonymity"] = json.dumps(report)
+        headers["X-Unknown-Values"] = json.dumps(unknowns)
+        send_head(writer, 200, headers, keep_alive)
+
+        try:
+            while chunk:
+                writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                await writer.drain()
+                chunk = await self.run(next, chunks, b"")
+        except (ValueError, KeyError, OSError) as error:
+            # too late for a status, a cut chunked body tells the client
+            raise ConnectionError(str(error)) from error
+        writer.write(b"0\r\n\r\n")
+
+
+def parse_query(headers, target: str) -> tuple:
+    query = {
+        key: values[-1] for key, values in parse_qs(urlsplit(target).query).items()
+    }
+    default_format = "arrow" if headers.get("content-type") == ARROW_STREAM else None
+    file_format = query.get("format", default_format)
+    if file_format is None:
+        raise RequestError(400, "Pass format= or an Arrow stream content type")
+    quasi_ids = query.get("quasi_ids")
+    if quasi_ids:
+        quasi_ids = cli.parse_quasi_ids(quasi_ids)
+    return file_format, quasi_ids, query.get("output_format")
+
+
+async def read_request(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise ConnectionError("Malformed request line") from None
+
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        raise ConnectionError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, target, headers, body
+
+
+def send_head(writer, status: int, headers: dict, keep_alive: bool):
+    headers["Connection"] = "keep-alive" if keep_alive else "close"
+    lines = [f"HTTP/1.1 {status} {http.client.responses[status]}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+
+def send_json(writer, status: int, content, keep_alive: bool):
+    body = json.dumps(content, ensure_ascii=False).encode()
+    headers = {"Content-Type": "application/json", "Content-Length": len(body)}
+    send_head(writer, status, headers, keep_alive)
+    writer.write(body)
+
+
+async def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    socket_path: str | None = None,
+    workers: int | None = None,
+    queue: int | None = None,
+):
+    warm_up()
+    service = Service(workers, queue)
+    if socket_path:
+        server = await asyncio.start_unix_server(service.handle, path=socket_path)
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+
+    address = socket_path or f"http://{host}:{port}"
+    print(f"service: {address}, {service.workers} workers", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+# ============================================
+# 📡 Client
+# ============================================
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float | None = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class Client:
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        socket_path: str | None = None,
+        timeout: float | None = None,
+    ):
+        if socket_path:
+            self.connection = UnixHTTPConnection(socket_path, timeout)
+        else:
+            self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def close(self):
+        self.connection.close()
+
+    def request(self, method: str, path: str, body: bytes | None = None, headers=None):
+        self.connection.request(method, path, body=body, headers=headers or {})
+        response = self.connection.getresponse()
+        content = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"{response.status}: {json.loads(content)['error']}")
+        return response, content
+
+    def health(self) -> dict:
+        return json.loads(self.request("GET", "/health")[1])
+
+    def anonymize(
+        self,
+        data: bytes,
+        file_format: str,
+        quasi_ids: str | None = None,
+        output_format: str | None = None,
+    ) -> tuple[bytes, dict | None, dict]:
+        query = {"format": file_format}
+        if quasi_ids:
+            query["quasi_ids"] = quasi_ids
+        if output_format:
+            query["output_format"] = output_format
+        response, content = self.request("POST", f"/anonymize?{urlencode(query)}", data)
+        report = response.getheader("X-K-Anonymity")
+        unknowns = json.loads(response.getheader("X-Unknown-Values", "{}"))
+        return content, json.loads(report) if report else None, unknowns
+
+    def report(self, data: bytes, file_format: str, quasi_ids: str) -> dict:
+        query = urlencode({"format": file_format, "quasi_ids": quasi_ids})
+        return json.loads(self.request("POST", f"/report?{query}", data)[1])
+
+    def anonymize_table(
+        self, table: pd.DataFrame, quasi_ids: str | None = None
+    ) -> tuple[pd.DataFrame, dict | None, dict]:
+        import pyarrow as pa
+
+        sink = io.BytesIO()
+        arrow_table = pa.Table.from_pandas(table, preserve_index=False)
+        with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+            writer.write_table(arrow_table)
+        content, report, unknowns = self.anonymize(sink.getvalue(), "arrow", quasi_ids)
+        return pa.ipc.open_stream(content).read_pandas(), report, unknowns
+
+
+# ============================================
+# ▶️ Command line
+# ============================================
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="service", description="Serve anonymization over local HTTP."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="listen on this Unix socket instead")
+    parser.add_argument("-j", "--workers", type=int, help="concurrent jobs")
+    parser.add_argument("--queue", type=int, help="jobs waiting for a worker")
+    parser.add_argument("--cards", choices=["mask", "pseudonymize"], default="mask")
+    args = parser.parse_args(argv)
+
+    try:
+        anon.set_card_mode(args.cards)
+    except ValueError as error:
+        print(f"service: {error}", file=sys.stderr)
+        return cli.EXIT_USAGE
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.socket, args.workers, args.queue))
+    except KeyboardInterrupt:
+        pass
+    return cli.EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import argparse
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import anonimization as anon
+import cli
+import quasi_search
+
+MAX_CACHE_BYTES = 256 << 20
+
+HELP = """Команды:
+  1 2 5          квази-идентификаторы по номеру или имени столбца
+  +N / -N        добавить или убрать столбец из текущего набора
+  drop           k-anonymity без каждого столбца текущего набора
+  compare [i j]  сравнить два запроса истории, по умолчанию два последних
+  undo           вернуться к предыдущему запросу
+  history        список запросов
+  help           эта справка
+  exit           выход"""
+
+
+# ============================================
+# 🧠 Session state
+# ============================================
+
+
+class Session:
+    def __init__(self, table: pd.DataFrame, max_bytes: int = MAX_CACHE_BYTES):
+        # columns are factorized once, every query works on integer codes
+        self.columns = [column for column in anon.methods if column in table.columns]
+        self.total = len(table)
+        self.codes, self.cardinalities = quasi_search.factorize_columns(
+            table, self.columns
+        )
+        self.max_bytes = max_bytes
+        self.group_ids_cache = OrderedDict()
+        self.reports = {}
+        self.history = []
+
+    def get_key(self, quasi_ids: list[str]) -> tuple:
+        missing = [column for column in quasi_ids if column not in self.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        return tuple(sorted({self.columns.index(column) for column in quasi_ids}))
+
+    def get_group_ids(self, key: tuple) -> np.ndarray:
+        if key in self.group_ids_cache:
+            self.group_ids_cache.move_to_end(key)
+            return self.group_ids_cache[key]
+
+        # extend the longest cached prefix one column at a time
+        length = next(
+            (
+                length
+                for length in range(len(key) - 1, 0, -1)
+                if key[:length] in self.group_ids_cache
+            ),
+            0,
+        )
+        if length:
+            ids = self.group_ids_cache[key[:length]]
+        else:
+            ids = self.codes[:, key[0]].astype(np.int64)
+            length = 1
+            self.cache(key[:1], ids)
+        for end in range(length, len(key)):
+            index = key[end]
+            ids = quasi_search.combine_codes(
+                ids, self.codes[:, index], self.cardinalities[index]
+            )
+            self.cache(key[: end + 1], ids)
+        return ids
+
+    def cache(self, key: tuple, ids: np.ndarray):
+        self.group_ids_cache[key] = ids
+        size = sum(cached.nbytes for cached in self.group_ids_cache.values())
+        while size > self.max_bytes and len(self.group_ids_cache) > 1:
+            _, evicted = self.group_ids_cache.popitem(last=False)
+            size -= evicted.nbytes
+
+    def report(self, quasi_ids: list[str]) -> dict:
+        key = self.get_key(quasi_ids)
+        if key not in self.reports:
+            self.reports[key] = quasi_search.summarize_ids(
+                self.get_group_ids(key), self.total
+            )
+        return self.reports[key]
+
+    def query(self, quasi_ids: list[str]) -> dict:
+        report = self.report(quasi_ids)
+        self.history.append(list(quasi_ids))
+        return report
+
+    def current(self) -> list[str]:
+        return self.history[-1] if self.history else []
+
+    def undo(self) -> list[str]:
+        if self.history:
+            self.history.pop()
+        return self.current()
+
+    def drop_each(self) -> pd.DataFrame:
+        # "what if column X is dropped" for every column of the current set
+        quasi_ids = self.current()
+        rows = []
+        for column in quasi_ids:
+            rest = [other for other in quasi_ids if other != column]
+            if rest:
+                rows.append(summary_row(f"без {column}", self.report(rest)))
+        return pd.DataFrame(rows)
+
+    def compare(self, first: int = -2, second: int = -1) -> pd.DataFrame:
+        rows = []
+        for position in (first, second):
+            quasi_ids = self.history[position]
+            rows.append(summary_row(", ".join(quasi_ids), self.report(quasi_ids)))
+        return pd.DataFrame(rows)
+
+
+def summary_row(title: str, report: dict) -> dict:
+    return {
+        "Квази-идентификаторы": title,
+        "k": report["k"],
+        "Процент строк с k >= k": round(report["fraction_good"], 2),
+        "Классов": report["groups"],
+        "Уникальных строк": report["unique_rows"],
+    }
+
+
+# ============================================
+# ⌨️ REPL
+# ============================================
+
+
+def parse_change(session: Session, command: str) -> list[str]:
+    column = cli.parse_quasi_ids(command[1:])[0]
+    quasi_ids = session.current()
+    if command[0] == "+":
+        return quasi_ids + [column] if column not in quasi_ids else quasi_ids
+    return [other for other in quasi_ids if other != column]
+
+
+def print_report(session: Session, report: dict, seconds: float):
+    print(f"Квази-идентификаторы: {', '.join(session.current())}")
+    anon.print_result(*anon.format_k_anonymity(report))
+    print("Количесвто уникальных по заданным квази-идентификаторам:")
+    print(report["groups"])
+    print(f"({seconds * 1000:.1f} мс)")
+
+
+def execute(session: Session, command: str):
+    started = time.perf_counter()
+    match command.split():
+        case ["help"]:
+            print(HELP)
+        case ["history"]:
+            for number, quasi_ids in enumerate(session.history, 1):
+                print(f"{number}: {', '.join(quasi_ids)}")
+        case ["undo"]:
+            quasi_ids = session.undo()
+            if quasi_ids:
+                report = session.report(quasi_ids)
+                print_report(session, report, time.perf_counter() - started)
+            else:
+                print("История пуста")
+        case ["drop"]:
+            print(session.drop_each().to_string(index=False))
+        case ["compare"]:
+            print(session.compare().to_string(index=False))
+        case ["compare", first, second]:
+            # numbers as shown by history
+            print(
+                session.compare(int(first) - 1, int(second) - 1).to_string(index=False)
+            )
+        case [change] if change[0] in "+-" and len(change) > 1:
+            report = session.query(parse_change(session, change))
+            print_report(session, report, time.perf_counter() - started)
+        case _:
+            report = session.query(cli.parse_quasi_ids(command))
+            print_report(session, report, time.perf_counter() - started)
+
+
+def run_session(session: Session, read=input):
+    print(HELP)
+    for key in "123456789":
+        print(f"{key}: {anon.get_quasis(key)[0]}")
+    while True:
+        try:
+            command = read("> ").strip()
+        except EOFError:
+            break
+        if command in ("exit", "quit"):
+            break
+        if not command:
+            continue
+        try:
+            execute(session, command)
+        except (ValueError, KeyError, IndexError) as error:
+            print(f"Ошибка: {error}")
+
+
+# ============================================
+# ▶️ Command line
+# ============================================
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="session", description="Explore k-anonymity of quasi-identifier sets."
+    )
+    parser.add_argument("input", help="input table")
+    parser.add_argument("--format", help="input format, by extension if omitted")
+    parser.add_argument("--cards", choices=["mask", "pseudonymize"], default="mask")
+    args = parser.parse_args(argv)
+
+    try:
+        anon.set_card_mode(args.cards)
+        table = anon.Load_table(args.input, anon.get_projection(), args.format)
+    except (OSError, ValueError) as error:
+        print(f"session: {error}", file=sys.stderr)
+        return cli.EXIT_USAGE
+
+    table = anon.full_anonymization(anon.table_validate(table))
+    run_session(Session(table))
+    return cli.EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
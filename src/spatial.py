@@ -0,0 +1,231 @@
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import dictionaries as dicts
+import lookup_tables
+
+DISTRICTS_PATH = Path(__file__).resolve().parent.parent / "data" / "districts.geojson"
+
+# without polygons a point takes the district of the nearest known store
+# coordinate, if it lies within this many degrees
+MAX_NEAREST_DISTANCE = 0.01
+
+CACHE_SIZE = 65536
+point_cache = OrderedDict()
+cache_lock = threading.Lock()
+
+
+# ============================================
+# 🗺️ District polygons
+# ============================================
+
+
+def parse_coords(coords: str) -> tuple:
+    lon, lat = str(coords).split(",")
+    return float(lon), float(lat)
+
+
+def load_polygons(path: Path = DISTRICTS_PATH) -> list:
+    # (name, rings) per polygon, multipolygons are split into parts
+    with open(path, encoding="utf-8") as file:
+        collection = json.load(file)
+
+    polygons = []
+    for feature in collection["features"]:
+        name = feature["properties"]["name"]
+        geometry = feature["geometry"]
+        match geometry["type"]:
+            case "Polygon":
+                parts = [geometry["coordinates"]]
+            case "MultiPolygon":
+                parts = geometry["coordinates"]
+            case other:
+                raise ValueError(f"Unsupported geometry for {name}: {other}")
+        for rings in parts:
+            polygons.append((name, [np.asarray(ring, dtype=float) for ring in rings]))
+    return polygons
+
+
+def points_in_rings(lons: np.ndarray, lats: np.ndarray, rings: list) -> np.ndarray:
+    # even-odd ray casting, holes are rings too
+    inside = np.zeros(len(lons), dtype=bool)
+    for ring in rings:
+        xi, yi = ring[:, 0], ring[:, 1]
+        xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+        crosses = (yi[None, :] > lats[:, None]) != (yj[None, :] > lats[:, None])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = (xj - xi)[None, :] * (lats[:, None] - yi[None, :]) / (yj - yi)[
+                None, :
+            ] + xi[None, :]
+        hits = crosses & (lons[:, None] < x_cross)
+        inside ^= hits.sum(axis=1) % 2 == 1
+    return inside
+
+
+class GridIndex:
+    def __init__(self, polygons: list, cell_size: float = 0.01):
+        self.names = [name for name, _ in polygons]
+        self.rings = [rings for _, rings in polygons]
+        self.cell_size = cell_size
+
+        bounds = np.array(
+            [
+                [ring[:, 0].min(), ring[:, 1].min(), ring[:, 0].max(), ring[:, 1].max()]
+                for ring in (rings[0] for rings in self.rings)
+            ]
+        )
+        self.origin = bounds[:, :2].min(axis=0)
+
+        # cell -> polygons whose bounding box touches it
+        self.cells = {}
+        for index, (min_x, min_y, max_x, max_y) in enumerate(bounds):
+            (x0, y0), (x1, y1) = self.cell(min_x, min_y), self.cell(max_x, max_y)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    self.cells.setdefault((x, y), []).append(index)
+
+    def cell(self, lon, lat):
+        x = np.floor((lon - self.origin[0]) / self.cell_size).astype(np.int64)
+        y = np.floor((lat - self.origin[1]) / self.cell_size).astype(np.int64)
+        return x, y
+
+    def locate(self, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        names = np.full(len(lons), None, dtype=object)
+        assigned = np.zeros(len(lons), dtype=bool)
+        xs, ys = self.cell(lons, lats)
+
+        # points sharing a cell are tested together against its candidates
+        keys = np.stack([xs, ys], axis=1)
+        cells, inverse = np.unique(keys, axis=0, return_inverse=True)
+        for cell_index, (x, y) in enumerate(cells):
+            points = np.flatnonzero(inverse.ravel() == cell_index)
+            for polygon in self.cells.get((int(x), int(y)), []):
+                pending = points[~assigned[points]]
+                if len(pending) == 0:
+                    break
+                inside = points_in_rings(
+                    lons[pending], lats[pending], self.rings[polygon]
+                )
+                names[pending[inside]] = self.names[polygon]
+                assigned[pending[inside]] = True
+        return names
+
+
+# ============================================
+# 📍 Nearest known coordinate
+# ============================================
+
+
+def known_points() -> tuple:
+    points = np.array([parse_coords(coords) for coords in dicts.districts])
+    return points, np.array(list(dicts.districts.values()), dtype=object)
+
+
+def locate_nearest(lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    points, names = known_points()
+    distance = np.hypot(
+        lons[:, None] - points[None, :, 0], lats[:, None] - points[None, :, 1]
+    )
+    nearest = distance.argmin(axis=1)
+    located = names[nearest].copy()
+    located[distance[np.arange(len(lons)), nearest] > MAX_NEAREST_DISTANCE] = None
+    return located
+
+
+grid_index = None
+
+
+def get_index():
+    global grid_index
+    if grid_index is None and DISTRICTS_PATH.exists():
+        grid_index = GridIndex(load_polygons(DISTRICTS_PATH))
+    return grid_index
+
+
+def locate_points(lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    grid = get_index()
+    if grid is None:
+        return locate_nearest(lons, lats)
+    return grid.locate(lons, lats)
+
+
+# ============================================
+# 🔎 Column lookup
+# ============================================
+
+
+def locate_uniques(uniques: list) -> list:
+    # the cache is shared by concurrent jobs, see service.py
+    with cache_lock:
+        return locate_cached(uniques)
+
+
+def locate_cached(uniques: list) -> list:
+    # least recently used coordinates are evicted past CACHE_SIZE
+    missing = [coords for coords in uniques if coords not in point_cache]
+    parsed = {}
+    for coords in missing:
+        try:
+            parsed[coords] = parse_coords(coords)
+        except ValueError:
+            point_cache[coords] = None
+    if parsed:
+        lons, lats = np.array(list(parsed.values()), dtype=float).T
+        for coords, name in zip(parsed, locate_points(lons, lats)):
+            point_cache[coords] = name
+
+    names = []
+    for coords in uniques:
+        point_cache.move_to_end(coords)
+        names.append(point_cache[coords])
+    while len(point_cache) > CACHE_SIZE:
+        point_cache.popitem(last=False)
+    return names
+
+
+def locate_value(coords: str) -> str:
+    # per-value twin of locate_column, for the reference engine
+    if pd.isna(coords):
+        return coords
+    name = dicts.districts.get(coords)
+    if name is None:
+        name = locate_uniques([coords])[0]
+    if name is None:
+        name = lookup_tables.unknown_value("districts", coords)
+    return name
+
+
+def locate_column(column: pd.Series) -> pd.Series:
+    # exact dictionary hits first, geometry only for the rest
+    codes, uniques = pd.factorize(column)
+    uniques = list(uniques)
+    names = [dicts.districts.get(coords) for coords in uniques]
+
+    missing = [index for index, name in enumerate(names) if name is None]
+    located = locate_uniques([uniques[index] for index in missing])
+    for index, name in zip(missing, located):
+        names[index] = name
+
+    unknown = [index for index, name in enumerate(names) if name is None]
+    if unknown:
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        lookup_tables.record_unknowns(
+            "districts", {uniques[index]: int(counts[index]) for index in unknown}
+        )
+        if lookup_tables.fallback is None:
+            raise KeyError(uniques[unknown[0]])
+        for index in unknown:
+            names[index] = lookup_tables.fallback
+
+    categories = list(dict.fromkeys(names))
+    positions = {name: position for position, name in enumerate(categories)}
+    unique_codes = np.array([positions[name] for name in names] + [-1])
+
+    # missing coordinates have code -1 and pick the trailing -1
+    located = pd.Categorical.from_codes(unique_codes[codes], categories=categories)
+    return pd.Series(located, index=column.index, name=column.name)
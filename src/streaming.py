@@ -0,0 +1,447 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+import anonimization as anon
+import lookup_tables
+import profiling
+import risk
+import suppression
+
+# ============================================
+# 📦 Chunked readers
+# ============================================
+
+
+def read_excel_chunks(path: Path, chunksize: int, columns: list[str] | None = None):
+    workbook = load_workbook(path, read_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = list(next(rows))
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) == chunksize:
+                chunk = pd.DataFrame(buffer, columns=header)
+                yield chunk if columns is None else chunk[columns]
+                buffer = []
+        if buffer:
+            chunk = pd.DataFrame(buffer, columns=header)
+            yield chunk if columns is None else chunk[columns]
+    finally:
+        workbook.close()
+
+
+def read_parquet_chunks(path: Path, chunksize: int, columns: list[str] | None = None):
+    import pyarrow.parquet as pq
+
+    batches = pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns)
+    for batch in batches:
+        yield batch.to_pandas()
+
+
+def read_feather_chunks(path: Path, chunksize: int, columns: list[str] | None = None):
+    import pyarrow as pa
+
+    with pa.memory_map(str(path)) as source:
+        reader = pa.ipc.open_file(source)
+        for index in range(reader.num_record_batches):
+            batch = reader.get_batch(index)
+            if columns is not None:
+                batch = batch.select(columns)
+            for start in range(0, batch.num_rows, chunksize):
+                yield batch.slice(start, chunksize).to_pandas()
+
+
+def read_chunks(
+    path: str,
+    chunksize: int = 50000,
+    file_format: str | None = None,
+    columns: list[str] | None = None,
+):
+    path = Path(path)
+    match anon.get_format(path, file_format):
+        case "excel":
+            yield from read_excel_chunks(path, chunksize, columns)
+        case "csv":
+            yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+        case "parquet":
+            yield from read_parquet_chunks(path, chunksize, columns)
+        case "feather":
+            yield from read_feather_chunks(path, chunksize, columns)
+
+
+# ============================================
+# 💾 Incremental writers
+# ============================================
+
+
+class ExcelChunkWriter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("Sheet1")
+        self.header_written = False
+
+    def write(self, chunk: pd.DataFrame):
+        if not self.header_written:
+            self.sheet.append(list(chunk.columns))
+            self.header_written = True
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            self.sheet.append(row)
+
+    def add_report(
+        self,
+        report: dict,
+        counts: dict | None = None,
+        quasi_ids: list[str] | None = None,
+    ):
+        # write-only sheets go after the data, in the order they are made
+        for title, rows in report_sheets(report, counts, quasi_ids):
+            sheet = self.workbook.create_sheet(title)
+            for row in rows:
+                sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class CsvChunkWriter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.header_written = False
+
+    def write(self, chunk: pd.DataFrame):
+        mode = "a" if self.header_written else "w"
+        chunk.to_csv(self.path, mode=mode, header=not self.header_written, index=False)
+        self.header_written = True
+
+    def close(self):
+        pass
+
+
+def wide_dictionaries(schema):
+    import pyarrow as pa
+
+    # the first chunk sizes dictionary indices to its own categories, int8
+    # under 128, and later chunks with more categories would not fit
+    for index, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            wide = pa.dictionary(pa.int32(), field.type.value_type)
+            schema = schema.set(index, field.with_type(wide))
+    return schema
+
+
+class ParquetChunkWriter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.writer = None
+        self.schema = None
+
+    def open(self, schema):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(self.path, schema)
+
+    def write(self, chunk: pd.DataFrame):
+        import pyarrow as pa
+
+        if self.writer is None:
+            self.schema = wide_dictionaries(
+                pa.Schema.from_pandas(chunk, preserve_index=False)
+            )
+            self.writer = self.open(self.schema)
+        batch = pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+        self.writer.write_table(batch)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class FeatherChunkWriter(ParquetChunkWriter):
+    def open(self, schema):
+        import pyarrow as pa
+
+        return pa.ipc.new_file(str(self.path), schema)
+
+    def write(self, chunk: pd.DataFrame):
+        # an IPC file holds one dictionary per field, chunks have their own
+        # categories, so categoricals are written as plain values
+        categorical = chunk.select_dtypes("category").columns
+        chunk = chunk.astype(
+            {column: chunk[column].cat.categories.dtype for column in categorical}
+        )
+        super().write(chunk)
+
+
+def open_writer(path: str, file_format: str | None = None):
+    path = Path(path)
+    match anon.get_format(path, file_format):
+        case "excel":
+            return ExcelChunkWriter(path)
+        case "csv":
+            return CsvChunkWriter(path)
+        case "parquet":
+            return ParquetChunkWriter(path)
+        case "feather":
+            return FeatherChunkWriter(path)
+
+
+def write_excel(
+    table: pd.DataFrame,
+    path: str,
+    report: dict | None = None,
+    quasi_ids: list[str] | None = None,
+    chunksize: int = 50000,
+):
+    # rows go out in slices, never as one object copy of the table
+    writer = ExcelChunkWriter(Path(path))
+    for start in range(0, len(table), chunksize):
+        writer.write(table.iloc[start : start + chunksize])
+    if not writer.header_written:
+        writer.sheet.append(list(table.columns))
+    if report is not None:
+        writer.add_report(report, add_column_counts(None, table), quasi_ids)
+    writer.close()
+
+
+# ============================================
+# 📋 Report sheets
+# ============================================
+
+
+def add_column_counts(counts: dict | None, chunk: pd.DataFrame) -> dict:
+    counts = counts or {}
+    for column in anon.methods:
+        if column not in chunk.columns:
+            continue
+        chunk_counts = chunk[column].value_counts(dropna=False)
+        # unused categories drop out, chunks may order categories differently
+        chunk_counts = chunk_counts[chunk_counts > 0]
+        chunk_counts.index = chunk_counts.index.astype(object)
+        if column in counts:
+            chunk_counts = counts[column].add(chunk_counts, fill_value=0)
+        counts[column] = chunk_counts.astype("int64")
+    return counts
+
+
+def generalization_stats(counts: dict) -> list[list]:
+    rows = [
+        [
+            "Столбец",
+            "Значений",
+            "Самое частое",
+            "Доля самого частого, %",
+            "Вне словарей и интервалов, %",
+            "Пустых, %",
+        ]
+    ]
+    for column, column_counts in counts.items():
+        total = column_counts.sum()
+        if total == 0:
+            continue
+        present = column_counts[column_counts.index.notna()]
+        unknown = present.get(lookup_tables.fallback, 0) if len(present) else 0
+        top = column_counts.idxmax()
+        rows.append(
+            [
+                column,
+                len(present),
+                None if pd.isna(top) else str(top),
+                round(column_counts.max() / total * 100, 2),
+                round(unknown / total * 100, 2),
+                round((total - present.sum()) / total * 100, 2),
+            ]
+        )
+    return rows
+
+
+def report_sheets(
+    report: dict, counts: dict | None = None, quasi_ids: list[str] | None = None
+) -> list[tuple]:
+    k = report["k"]
+    summary = [
+        ["Показатель", "Значение"],
+        ["Квази-идентификаторы", ", ".join(quasi_ids or [])],
+        ["Приемлемое значение K-Anonymity", k],
+        ["Строк", report["rows"]],
+        ["Классов эквивалентности", report["groups"]],
+        [f"Строк с k >= {k}", report["rows_good"]],
+        [f"Процент строк с k >= {k}", round(report["fraction_good"], 2)],
+        ["Уникальных строк (k = 1)", report["unique_rows"]],
+    ]
+    if "suppression" in report:
+        summary.append(
+            ["Удалено строк малых классов", report["suppression"]["suppressed_rows"]]
+        )
+        summary.append(
+            ["Объединено строк малых классов", report["suppression"]["merged_rows"]]
+        )
+    bad_k = [["K-Anonymity", "Процент"]]
+    bad_k += [[size, round(percent, 2)] for size, percent in report["bad_k"]]
+
+    sheets = [("K-Anonymity", summary), ("Плохие k", bad_k)]
+    if counts:
+        sheets.append(("Обобщение столбцов", generalization_stats(counts)))
+    return sheets
+
+
+# ============================================
+# ⚙️ Streaming pipeline
+# ============================================
+
+
+def add_group_counts(
+    counts: pd.Series | None, chunk: pd.DataFrame, quasi_ids: list[str]
+) -> pd.Series:
+    chunk_counts = chunk.groupby(quasi_ids, observed=True).size()
+    if counts is None:
+        return chunk_counts
+    return counts.add(chunk_counts, fill_value=0).astype("int64")
+
+
+def anonymized_chunks(
+    in_path: str,
+    chunksize: int,
+    in_format: str | None,
+    workers: int | None,
+    columns: list[str] | None = None,
+):
+    for chunk in read_chunks(in_path, chunksize, in_format, columns):
+        chunk = anon.table_validate(chunk)
+        yield anon.full_anonymization(chunk, workers=workers)
+
+
+def add_class_counts(
+    counts: pd.Series | None, chunk: pd.DataFrame, quasi_ids: list[str]
+) -> pd.Series:
+    # classes as suppression sees them: missing values form classes too and
+    # classes keep the order of first appearance, which breaks merge ties;
+    # object keys, since chunks carry their own categories
+    keys = chunk[quasi_ids].astype(object)
+    chunk_counts = keys.groupby(quasi_ids, dropna=False, sort=False).size()
+    if counts is None:
+        return chunk_counts
+    levels = list(range(len(quasi_ids)))
+    return (
+        pd.concat([counts, chunk_counts])
+        .groupby(level=levels, dropna=False, sort=False)
+        .sum()
+    )
+
+
+def plan_suppression(
+    chunks, quasi_ids: list[str], max_suppression: float, method: str
+) -> tuple | None:
+    # a first pass sizes every class of the whole input
+    counts = None
+    for chunk in chunks:
+        counts = add_class_counts(counts, chunk, quasi_ids)
+    if counts is None:
+        return None
+    classes = counts.index.to_frame(index=False)
+    return (classes,) + suppression.plan_classes(
+        classes, counts.to_numpy(), max_suppression, method
+    )
+
+
+def chunk_class_ids(
+    chunk: pd.DataFrame, quasi_ids: list[str], classes: pd.DataFrame
+) -> np.ndarray:
+    # a left merge keeps the chunk order and matches missing values
+    numbered = classes.assign(class_id=np.arange(len(classes)))
+    keys = chunk[quasi_ids].astype(object)
+    return keys.merge(numbered, on=quasi_ids, how="left")["class_id"].to_numpy()
+
+
+def suppressed_chunks(chunks, quasi_ids: list[str], plan: tuple):
+    classes, dropped, target, _ = plan
+    for chunk in chunks:
+        ids = chunk_class_ids(chunk, quasi_ids, classes)
+        yield suppression.apply_plan(chunk, quasi_ids, ids, classes, dropped, target)
+
+
+def stream_anonymization(
+    in_path: str,
+    out_path: str | None,
+    quasi_ids: list[str] | None = None,
+    chunksize: int = 50000,
+    in_format: str | None = None,
+    out_format: str | None = None,
+    workers: int | None = None,
+    suppress: str | None = None,
+    max_suppression: float = 5.0,
+    with_risk: bool = False,
+    sampling_fraction: float = 1.0,
+) -> dict | None:
+    counts = None
+    column_counts = None
+    total = 0
+
+    # without an output only the groups are counted, so only the
+    # quasi-identifiers are read
+    columns = None if out_path else anon.get_projection(quasi_ids)
+
+    plan = None
+    if suppress:
+        # small classes are only known once the whole input was counted,
+        # so suppression reads and generalizes the input twice
+        with profiling.stage("plan suppression"):
+            plan = plan_suppression(
+                anonymized_chunks(in_path, chunksize, in_format, workers, columns),
+                quasi_ids,
+                max_suppression,
+                suppress,
+            )
+
+    def final_chunks(columns: list[str] | None):
+        chunks = anonymized_chunks(in_path, chunksize, in_format, workers, columns)
+        if plan is None:
+            return chunks
+        return suppressed_chunks(chunks, quasi_ids, plan)
+
+    writer = open_writer(out_path, out_format) if out_path else None
+    try:
+        for chunk in final_chunks(columns):
+            if writer is not None:
+                with profiling.stage("export", len(chunk)):
+                    writer.write(chunk)
+
+            total += len(chunk)
+            if quasi_ids:
+                counts = add_group_counts(counts, chunk, quasi_ids)
+                if isinstance(writer, ExcelChunkWriter):
+                    column_counts = add_column_counts(column_counts, chunk)
+
+        report = None
+        if quasi_ids and total:
+            # the k the stage suppressed for, not the one of the rows left
+            k = plan[3]["k"] if plan is not None else None
+            report = anon.k_anonymity_from_group_sizes(counts, total, k)
+            if plan is not None:
+                report["suppression"] = plan[3]
+            if isinstance(writer, ExcelChunkWriter):
+                writer.add_report(report, column_counts, quasi_ids)
+    except BaseException:
+        # a failed run leaves no truncated output behind
+        if writer is not None:
+            writer.close()
+            Path(out_path).unlink(missing_ok=True)
+        raise
+    if writer is not None:
+        writer.close()
+
+    if with_risk and report is not None:
+        # the sketch reads the quasi-identifiers twice more, after suppression
+        with profiling.stage("approximate risk", total):
+            report["risk"] = risk.approximate_risk_chunks(
+                lambda: final_chunks(anon.get_projection(quasi_ids)),
+                quasi_ids,
+                sampling_fraction=sampling_fraction,
+                k=report["k"],
+            )
+    return report
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+import anonimization as anon
+
+# memory for the source-to-target comparisons of one block
+BLOCK_BYTES = 64 << 20
+
+# ============================================
+# 🧹 Small equivalence classes
+# ============================================
+
+
+def get_class_ids(table: pd.DataFrame, quasi_ids: list[str]) -> np.ndarray:
+    grouped = table.groupby(quasi_ids, observed=True, sort=False, dropna=False)
+    return grouped.ngroup().to_numpy()
+
+
+def select_within_budget(
+    sizes: np.ndarray, small: np.ndarray, budget_rows: int
+) -> np.ndarray:
+    # smallest classes first, as long as their rows fit into the budget
+    order = np.flatnonzero(small)
+    order = order[np.argsort(sizes[order], kind="stable")]
+    fits = np.cumsum(sizes[order]) <= budget_rows
+
+    selected = np.zeros(len(sizes), dtype=bool)
+    selected[order[fits]] = True
+    return selected
+
+
+def nearest_classes(
+    class_codes: np.ndarray,
+    sizes: np.ndarray,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    block_bytes: int = BLOCK_BYTES,
+) -> np.ndarray:
+    # fewest differing quasi-identifiers, the largest class on ties
+    target_codes = class_codes[targets]
+    tie_break = sizes[targets] / (sizes[targets].max() + 1)
+
+    # per source: a boolean per target and column, int and float distances
+    row_bytes = len(targets) * (class_codes.shape[1] + 16)
+    block = max(1, block_bytes // row_bytes)
+
+    nearest = np.empty(len(sources), dtype=np.int64)
+    for start in range(0, len(sources), block):
+        source_codes = class_codes[sources[start : start + block]]
+        distance = (source_codes[:, None, :] != target_codes[None, :, :]).sum(axis=2)
+        nearest[start : start + block] = targets[
+            np.argmin(distance - tie_break, axis=1)
+        ]
+    return nearest
+
+
+def plan_classes(
+    classes: pd.DataFrame,
+    sizes: np.ndarray,
+    max_suppression: float = 5.0,
+    method: str = "suppress",
+    k: int | None = None,
+) -> tuple:
+    # classes holds the quasi-identifiers of each class, in class id order;
+    # the plan drops classes, or points each one at the class it merges into
+    if method not in ("suppress", "merge"):
+        raise ValueError(f"Unknown suppression method: {method}")
+
+    total = int(sizes.sum())
+    k = k or anon.get_good_k_for_rows(total)
+    budget_rows = int(total * max_suppression / 100)
+
+    small = sizes < k
+    selected = select_within_budget(sizes, small, budget_rows)
+    stats = {
+        "method": method,
+        "k": k,
+        "rows": total,
+        "budget_rows": budget_rows,
+        "small_rows": int(sizes[small].sum()),
+        "suppressed_rows": 0,
+        "merged_rows": 0,
+        "remaining_small_rows": int(sizes[small & ~selected].sum()),
+    }
+
+    target = np.arange(len(sizes))
+    dropped = np.zeros(len(sizes), dtype=bool)
+    if method == "suppress":
+        dropped = selected
+        stats["suppressed_rows"] = int(sizes[selected].sum())
+    elif selected.any():
+        large = np.flatnonzero(~small)
+        if len(large) == 0:
+            raise ValueError(f"No class reaches k={k}, small classes cannot be merged")
+        class_codes = np.column_stack(
+            [pd.factorize(classes[column])[0] for column in classes.columns]
+        )
+        target[selected] = nearest_classes(
+            class_codes, sizes, np.flatnonzero(selected), large
+        )
+        stats["merged_rows"] = int(sizes[selected].sum())
+    return dropped, target, stats
+
+
+def apply_plan(
+    table: pd.DataFrame,
+    quasi_ids: list[str],
+    ids: np.ndarray,
+    classes: pd.DataFrame,
+    dropped: np.ndarray,
+    target: np.ndarray,
+) -> pd.DataFrame:
+    # boolean indexing copies, the caller's table is never changed
+    kept = ~dropped[ids]
+    table, ids = table[kept], ids[kept]
+
+    # rows take the quasi-identifiers of their target class, which are their
+    # own unless the class was merged
+    if (target != np.arange(len(target))).any():
+        for column in quasi_ids:
+            table[column] = classes[column].take(target[ids]).set_axis(table.index)
+    return table
+
+
+def suppress_small_groups(
+    table: pd.DataFrame,
+    quasi_ids: list[str],
+    max_suppression: float = 5.0,
+    method: str = "suppress",
+    k: int | None = None,
+) -> tuple:
+    ids = get_class_ids(table, quasi_ids)
+    first_rows = np.unique(ids, return_index=True)[1]
+    classes = table[quasi_ids].take(first_rows)
+
+    dropped, target, stats = plan_classes(
+        classes, np.bincount(ids), max_suppression, method, k
+    )
+    return apply_plan(table, quasi_ids, ids, classes, dropped, target), stats
+
+
+def print_suppression(stats: dict):
+    print(
+        f"Малые классы (k < {stats['k']}): {stats['small_rows']} строк, "
+        f"удалено {stats['suppressed_rows']}, объединено {stats['merged_rows']}, "
+        f"осталось {stats['remaining_small_rows']}"
+    )
@@ -0,0 +1,114 @@
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+import dictionaries as dicts
+import streaming
+
+COLUMNS = [
+    "store_name",
+    "date-time",
+    "coordinates",
+    "categories",
+    "brands",
+    "price",
+    "cards_number",
+    "number_of_products",
+    "receipt_id",
+    "total_cost",
+]
+
+CARD_BINS = [2200, 2202, 4100, 4210, 4230, 4040, 5190, 5200, 5536]
+
+
+# ============================================
+# 🧾 Synthetic receipts
+# ============================================
+
+
+def generate_receipts(
+    rows: int,
+    seed: int = 0,
+    first_receipt: int = 1,
+    customers: int | None = None,
+) -> pd.DataFrame:
+    # a receipt has number_of_products rows sharing store, time and card
+    rng = np.random.default_rng(seed)
+    stores = np.array(list(dicts.anonymized_stores), dtype=object)
+    coords = np.array(list(dicts.districts), dtype=object)
+    products = np.array(list(dicts.categories), dtype=object)
+    brands = np.array(list(dicts.brands), dtype=object)
+    customers = customers or max(rows // 20, 1)
+
+    sizes = rng.integers(1, 9, size=rows // 2 + 1)
+    sizes = sizes[: np.searchsorted(np.cumsum(sizes), rows) + 1]
+    receipts = len(sizes)
+
+    store = rng.integers(0, len(stores), size=receipts)
+    minutes = rng.integers(0, 365 * 24 * 60, size=receipts)
+    dates = np.datetime64("2024-01-01T00:00") + minutes.astype("timedelta64[m]")
+    customer = rng.integers(0, customers, size=receipts)
+    cards = (
+        np.array(CARD_BINS, dtype=np.int64)[customer % len(CARD_BINS)] * 10**12
+        + customer * 7919 % 10**12
+    )
+
+    price = np.maximum(rng.lognormal(6.0, 1.6, size=sizes.sum()).astype(np.int64), 1)
+    receipt_of_row = np.repeat(np.arange(receipts), sizes)
+    total_cost = np.bincount(receipt_of_row, weights=price).astype(np.int64)
+
+    table = pd.DataFrame(
+        {
+            "store_name": stores[store][receipt_of_row],
+            "date-time": np.datetime_as_string(dates, unit="m")[receipt_of_row],
+            "coordinates": coords[store % len(coords)][receipt_of_row],
+            "categories": products[rng.integers(0, len(products), size=len(price))],
+            "brands": brands[rng.integers(0, len(brands), size=len(price))],
+            "price": price,
+            "cards_number": cards[receipt_of_row],
+            "number_of_products": sizes[receipt_of_row],
+            "receipt_id": np.char.add(
+                "№", (receipt_of_row + first_receipt).astype(str)
+            ).astype(object),
+            "total_cost": total_cost[receipt_of_row],
+        },
+        columns=COLUMNS,
+    )
+    return table.iloc[:rows]
+
+
+def write_receipts(path: str, rows: int, seed: int = 0, chunk_rows: int = 1_000_000):
+    # chunks keep 10M-row files within memory
+    writer = streaming.open_writer(path)
+    receipt = 1
+    try:
+        for index, start in enumerate(range(0, rows, chunk_rows)):
+            chunk = generate_receipts(
+                min(chunk_rows, rows - start),
+                seed=seed + index,
+                first_receipt=receipt,
+                customers=max(rows // 20, 1),
+            )
+            receipt += chunk["receipt_id"].nunique()
+            writer.write(chunk)
+    finally:
+        writer.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="synthetic", description="Write a synthetic receipts table."
+    )
+    parser.add_argument("output", help="xlsx, csv, parquet or feather file")
+    parser.add_argument("-n", "--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    write_receipts(args.output, args.rows, args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import anonimization as anon
+import check_engines
+import lookup_tables
+
+STORE = "Лента (Обводного канала, 118 к7)"
+COORDS = "30.30193,59.90715"
+
+
+@pytest.fixture
+def card_mode(monkeypatch):
+    # card mode is global, put the default back after each test
+    monkeypatch.setenv(anon.CARD_KEY_ENV, "test-key")
+    yield anon.set_card_mode
+    anon.set_card_mode("mask")
+
+
+@pytest.fixture
+def edge_table() -> pd.DataFrame:
+    table = pd.DataFrame(
+        {
+            "store_name": [STORE, "Неизвестный магазин", STORE, np.nan],
+            "date-time": [
+                "2020-06-22T15:53",
+                "2021-01-01T00:00",
+                "2019-12-31T23:59",
+                "2020-02-29T12:00",
+            ],
+            # a dictionary hit, a point outside every district, a point
+            # found by geometry only and a value that is not coordinates
+            "coordinates": [COORDS, "0.0,0.0", "30.3,59.95", "не координаты"],
+            "categories": ["Хлеб", "Неизвестная категория", "Хлеб", np.nan],
+            "brands": ["President", "Неизвестный бренд", "President", "President"],
+            "price": [277, -5, 0.5, 1e9],
+            "cards_number": [2200009557634620, np.nan, 4000000000000002, np.nan],
+            "number_of_products": [3, -1, 2.5, 0],
+            "total_cost": [662, -100.25, 0.01, 99999.5],
+        }
+    )
+    return anon.table_validate(table)
+
+
+def test_engines_match_on_sample_table():
+    assert check_engines.check_engines(str(check_engines.DEFAULT_INPUT)) == []
+
+
+@pytest.mark.parametrize("mode", ["mask", "pseudonymize"])
+def test_engines_match_on_edge_cases(edge_table, card_mode, mode):
+    card_mode(mode)
+    assert anon.compare_engines(edge_table) == []
+
+
+def test_edge_cases_fall_back_and_stay_missing(edge_table):
+    with lookup_tables.collect_unknowns() as unknowns:
+        table = anon.full_anonymization(edge_table)
+
+    assert table["store_name"].iloc[1] == lookup_tables.fallback
+    assert table["categories"].iloc[1] == lookup_tables.fallback
+    assert table["brands"].iloc[1] == lookup_tables.fallback
+    assert table["coordinates"].iloc[1] == lookup_tables.fallback
+    assert pd.isna(table["store_name"].iloc[3])
+    assert table["cards_number"].isna().tolist() == [False, True, False, True]
+    assert lookup_tables.unknowns_snapshot(unknowns)["brands"] == {
+        "Неизвестный бренд": 1
+    }